@@ -1,9 +1,17 @@
 import streamlit as st
-from search_agent import search_products_with_web_search
-from qdrant_manager import get_collection_stats, get_all_products, search_similar_products
-from groq_analyzer import compare_products_with_groq, ask_about_ingredients
-from ingredient_analyzer import extract_harmful_ingredients, get_risk_emoji
+from search_agent import search_products_async, get_search_job, format_search_job, get_tavily_client
+from qdrant_manager import (
+    get_collection_stats, search_similar_products, get_model, get_qdrant_client,
+    get_query_embedding_stats, get_products_page, get_products_by_ids, backfill_risk_fields
+)
+from groq_analyzer import (
+    compare_products_with_groq, ask_about_ingredients, get_analysis_cache_stats, get_groq_client,
+    get_routing_stats
+)
+from ingredient_analyzer import get_risk_emoji, get_analysis_label
+from tracing import get_stage_histograms, histogram_percentile
 import os
+import time
 
 # Set page configuration
 st.set_page_config(
@@ -12,6 +20,19 @@ st.set_page_config(
     layout="centered"
 )
 
+
+@st.cache_resource(show_spinner="Loading product database...")
+def load_search_backend():
+    """Build the embedding model and API clients once per server process"""
+    get_qdrant_client()
+    # Products saved before risk fields were stored at ingest
+    backfill_risk_fields()
+    get_model()
+    get_groq_client()
+    get_tavily_client()
+    return True
+
+
 # Initialize session state
 if 'selected_stores' not in st.session_state:
     st.session_state.selected_stores = []
@@ -23,6 +44,17 @@ if 'search_results' not in st.session_state:
     st.session_state.search_results = None
 if 'is_searching' not in st.session_state:
     st.session_state.is_searching = False
+if 'search_job' not in st.session_state:
+    st.session_state.search_job = None
+
+# Payload fields loaded per view (the full payload includes long AI analyses)
+BROWSE_FIELDS = ['title', 'store', 'url', 'image', 'ingredients', 'groq_analysis', 'analysis_route']
+PICKER_FIELDS = ['title', 'store']
+COMPARE_FIELDS = ['title', 'store', 'ingredients', 'groq_analysis']
+PAGE_SIZE = 20
+# Seconds between refreshes while search results are still being analysed
+POLL_INTERVAL = 1.0
+poll_search_job = False
 
 # Available stores
 stores = [
@@ -105,14 +137,44 @@ elif st.session_state.step == 2:
             st.info("Get your free API key at: https://tavily.com")
             st.session_state.is_searching = False
         else:
+            load_search_backend()
             with st.spinner("🔍 Searching for products..."):
-                # Call the search agent
-                results = search_products_with_web_search(
-                    search_query,
-                    st.session_state.selected_stores
+                # Returns the Tavily hits; analysis continues in the background
+                results = search_products_async(search_query, st.session_state.selected_stores)
+            
+            st.session_state.is_searching = False
+            if results.get("success") and results.get("job_id"):
+                st.session_state.search_job = dict(
+                    results,
+                    product_description=search_query,
+                    stores=list(st.session_state.selected_stores)
                 )
+                st.session_state.search_results = None
+            else:
+                # Failed, or nothing matched the selected stores
                 st.session_state.search_results = results
-                st.session_state.is_searching = False
+            st.rerun()
+    
+    # Results still being analysed: show what is ready and refresh until done
+    if st.session_state.search_job:
+        search_job = st.session_state.search_job
+        job = get_search_job(search_job["job_id"])
+        if job is None:
+            st.session_state.search_job = None
+        elif job["status"] == "running":
+            st.divider()
+            st.subheader("Search Results")
+            st.markdown(format_search_job(job, search_job["product_description"], search_job["stores"]))
+            poll_search_job = True
+        else:
+            # Done: keep the final results like a finished search
+            st.session_state.search_results = {
+                "success": True,
+                "results": format_search_job(job, search_job["product_description"], search_job["stores"]),
+                "search_engine": search_job.get("search_engine", "Tavily"),
+                "trace": job["trace"] or search_job.get("trace")
+            }
+            st.session_state.search_job = None
     
     # Display search results
     if st.session_state.search_results:
@@ -127,6 +189,7 @@ elif st.session_state.step == 2:
         
         if st.button("New Search"):
             st.session_state.search_results = None
+            st.session_state.search_job = None
             st.session_state.search_items = ""
             st.rerun()
 
@@ -146,6 +209,25 @@ with st.sidebar:
     if st.session_state.search_items:
         st.write("**Search Query:**")
         st.write(st.session_state.search_items)
+    
+    # Where the last search spent its time (stages running in parallel overlap)
+    last_trace = (st.session_state.search_results or {}).get("trace")
+    if last_trace:
+        st.divider()
+        st.subheader("⏱️ Last Search Timing")
+        st.write(f"**Total:** {last_trace['duration_ms'] / 1000:.2f}s")
+        for stage, timing in last_trace["stages"].items():
+            line = f"{stage}: {timing['total_ms'] / 1000:.2f}s over {timing['count']} call(s), slowest {timing['max_ms'] / 1000:.2f}s"
+            if timing.get("total_tokens"):
+                line += f", {timing['total_tokens']} tokens"
+            st.caption(line)
+    
+    # Latency of every stage across all searches since the server started
+    histograms = get_stage_histograms()
+    if histograms:
+        with st.expander("📊 Latency Since Start"):
+            for stage, counts in sorted(histograms.items()):
+                st.caption(f"{stage}: {sum(counts.values())} call(s), p50 {histogram_percentile(counts, 0.5)}, p95 {histogram_percentile(counts, 0.95)}")
     # Database stats
     st.divider()
     st.subheader("💾 Database Stats")
@@ -154,6 +236,14 @@ with st.sidebar:
         if stats:
             st.metric("Total Products Saved", stats.get('total_products', 0))
             
+            cache_stats = get_analysis_cache_stats()
+            st.caption(f"AI analysis cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+            routing = get_routing_stats()
+            if routing['local'] or routing['triaged'] or routing['deep']:
+                st.caption(f"AI triage: {routing['local']} scored from the ingredient database, {routing['triaged']} cleared, {routing['escalated']} sent to full analysis (~{routing['saved_seconds']:.0f}s saved)")
+            embed_stats = get_query_embedding_stats()
+            st.caption(f"Query embedding cache: {embed_stats['hit_rate']:.0%} hit rate ({embed_stats['entries']} queries)")
+            
             # View all products button
             if st.button("View Saved Products"):
                 st.session_state.show_database = True
@@ -172,26 +262,38 @@ if st.session_state.get('show_database', False):
     st.subheader("💾 Saved Products Database")
     
     try:
-        products = get_all_products()
-        if products:
-            st.write(f"Found {len(products)} products in database")
+        load_search_backend()
+        total_products = get_collection_stats().get('total_products', 0)
+        if total_products:
+            st.write(f"Found {total_products} products in database")
             
             # Search within saved products
             search_query = st.text_input("Search saved products:", key="db_search")
+            filter_col1, filter_col2 = st.columns(2)
+            with filter_col1:
+                filter_stores = st.multiselect("Only these stores", options=stores, key="db_filter_stores")
+            with filter_col2:
+                hide_risks = st.multiselect("Hide risk levels", options=["HIGH", "MODERATE", "UNKNOWN"], key="db_hide_risks")
             if search_query:
-                similar = search_similar_products(search_query, limit=10)
+                # Filters are applied inside Qdrant, not on the returned hits
+                similar = search_similar_products(
+                    search_query,
+                    limit=10,
+                    stores=filter_stores,
+                    exclude_risk_levels=hide_risks
+                )
                 for result in similar:
                     payload = result.payload
                     
-                    # Extract harmful info if analysis exists
+                    # Risk summary stored with the product at save time
                     harmful_info = None
                     if payload.get('groq_analysis'):
-                        harmful_info = extract_harmful_ingredients(payload.get('groq_analysis'))
+                        harmful_info = payload
                     
                     # Title with risk indicator
                     title_display = f"{payload.get('title', 'Unknown')} - {payload.get('store', 'Unknown Store')}"
                     if harmful_info:
-                        risk_emoji = get_risk_emoji(harmful_info['risk_level'])
+                        risk_emoji = get_risk_emoji(harmful_info.get('risk_level', 'UNKNOWN'))
                         title_display = f"{risk_emoji} {title_display}"
                     
                     with st.expander(title_display):
@@ -203,26 +305,35 @@ if st.session_state.get('show_database', False):
                         st.write(f"**URL:** {payload.get('url', 'N/A')}")
                         
                         if harmful_info:
-                            st.write(f"**Safety Rating:** {get_risk_emoji(harmful_info['risk_level'])} {harmful_info['risk_level']}")
+                            st.write(f"**Safety Rating:** {get_risk_emoji(harmful_info.get('risk_level', 'UNKNOWN'))} {harmful_info.get('risk_level', 'UNKNOWN')}")
                             
-                            if harmful_info['has_harmful']:
+                            if harmful_info.get('has_harmful'):
                                 st.warning("**⚠️ Harmful Ingredients Detected**")
-                                if harmful_info['harmful_list']:
-                                    for h in harmful_info['harmful_list']:
+                                if harmful_info.get('harmful_list'):
+                                    for h in harmful_info.get('harmful_list'):
                                         st.write(f"- {h}")
                             else:
                                 st.success("**✅ No harmful ingredients detected**")
                         
                         if payload.get('groq_analysis'):
-                            with st.expander("View Full AI Analysis"):
+                            with st.expander(f"View {get_analysis_label(payload.get('analysis_route'))}"):
                                 st.write(payload.get('groq_analysis'))
                         else:
                             st.write(f"**Ingredients/Details:** {payload.get('ingredients', 'N/A')}")
                         
-                        st.write(f"**Similarity Score:** {result.score:.2f}")
+                        st.write(f"**Match Score:** {result.score:.2f}")
             else:
-                # Show all products
-                for product in products[:20]:  # Show first 20
+                # Page through products using scroll cursors
+                if 'db_page_offsets' not in st.session_state:
+                    st.session_state.db_page_offsets = [None]
+                page_offsets = st.session_state.db_page_offsets
+                products, next_offset = get_products_page(
+                    offset=page_offsets[-1],
+                    limit=PAGE_SIZE,
+                    fields=BROWSE_FIELDS
+                )
+                
+                for product in products:
                     payload = product.payload
                     with st.expander(f"{payload.get('title', 'Unknown')} - {payload.get('store', 'Unknown Store')}"):
                         # Show product image if available
@@ -233,10 +344,22 @@ if st.session_state.get('show_database', False):
                         st.write(f"**URL:** {payload.get('url', 'N/A')}")
                         
                         if payload.get('groq_analysis'):
-                            st.write(f"**🤖 AI Analysis:**")
+                            st.write(f"**{get_analysis_label(payload.get('analysis_route'))}:**")
                             st.write(payload.get('groq_analysis'))
                         else:
                             st.write(f"**Ingredients/Details:** {payload.get('ingredients', 'N/A')}")
+                
+                prev_col, page_col, next_col = st.columns(3)
+                with prev_col:
+                    if len(page_offsets) > 1 and st.button("← Previous"):
+                        page_offsets.pop()
+                        st.rerun()
+                with page_col:
+                    st.caption(f"Page {len(page_offsets)}")
+                with next_col:
+                    if next_offset is not None and st.button("Next →"):
+                        page_offsets.append(next_offset)
+                        st.rerun()
         else:
             st.info("No products saved yet. Search for products to populate the database!")
     except Exception as e:
@@ -244,6 +367,7 @@ if st.session_state.get('show_database', False):
     
     if st.button("Close Database View"):
         st.session_state.show_database = False
+        st.session_state.db_page_offsets = [None]
         st.rerun()
 
 # AI Chat Interface
@@ -254,9 +378,10 @@ if st.session_state.get('show_ai_chat', False):
     
     # Get all products for context
     try:
-        all_products = get_all_products()
+        load_search_backend()
+        total_products = get_collection_stats().get('total_products', 0)
         
-        if all_products:
+        if total_products:
             # Question input
             user_question = st.text_input(
                 "Ask about ingredients, allergens, or product comparisons:",
@@ -287,23 +412,46 @@ if st.session_state.get('show_ai_chat', False):
             st.divider()
             st.subheader("Compare Products")
             
-            if len(all_products) >= 2:
+            if total_products >= 2:
                 st.write("Select products to compare:")
                 
-                # Create product selection
-                product_options = {f"{p.payload.get('title')} ({p.payload.get('store')})": p for p in all_products[:10]}
+                # Picker options are loaded a page at a time, titles and stores only,
+                # and reloaded when products are saved (e.g. by background enrichment)
+                if st.session_state.get('compare_options_total') != total_products:
+                    page, next_offset = get_products_page(limit=PAGE_SIZE, fields=PICKER_FIELDS)
+                    st.session_state.compare_options = {
+                        f"{p.payload.get('title')} ({p.payload.get('store')})": str(p.id) for p in page
+                    }
+                    st.session_state.compare_next_offset = next_offset
+                    st.session_state.compare_options_total = total_products
+                product_options = st.session_state.compare_options
+                
                 selected_products = st.multiselect(
                     "Choose 2-5 products",
                     options=list(product_options.keys()),
                     max_selections=5
                 )
                 
+                if st.session_state.compare_next_offset is not None and st.button("Load more products"):
+                    page, next_offset = get_products_page(
+                        offset=st.session_state.compare_next_offset,
+                        limit=PAGE_SIZE,
+                        fields=PICKER_FIELDS
+                    )
+                    for p in page:
+                        product_options[f"{p.payload.get('title')} ({p.payload.get('store')})"] = str(p.id)
+                    st.session_state.compare_next_offset = next_offset
+                    st.rerun()
+                
                 if len(selected_products) >= 2 and st.button("Compare Selected Products"):
                     with st.spinner("AI is comparing..."):
                         # Prepare product data
                         products_to_compare = []
-                        for prod_key in selected_products:
-                            prod = product_options[prod_key]
+                        selected_points = get_products_by_ids(
+                            [product_options[prod_key] for prod_key in selected_products],
+                            fields=COMPARE_FIELDS
+                        )
+                        for prod in selected_points:
                             products_to_compare.append({
                                 'title': prod.payload.get('title'),
                                 'store': prod.payload.get('store'),
@@ -331,4 +479,11 @@ if st.session_state.get('show_ai_chat', False):
     
     if st.button("Close AI Assistant"):
         st.session_state.show_ai_chat = False
+        st.session_state.pop('compare_options', None)
+        st.session_state.pop('compare_options_total', None)
         st.rerun()
+
+# Keep refreshing while a search's products are still being analysed
+if poll_search_job:
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
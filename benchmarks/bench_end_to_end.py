@@ -0,0 +1,246 @@
+"""
+End-to-end search benchmark with every external service replaced by a
+deterministic local fake (Tavily, Groq, Inngest and store product pages, see
+fake_services.py and fake_groq_server.py).
+
+Runs `search_products_with_web_search` at several Tavily result counts, first
+cold and then repeated (warm caches), then `save_product_to_qdrant` and
+`search_similar_products` (plain, filtered and ingredient lookups) at several
+collection sizes. For every stage it
+reports p50/p95 latency and throughput. Saved products go to a throwaway
+Qdrant directory; the embedding model is the real one.
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--results 3,10] [--collection-sizes 100,1000]
+        [--searches 5] [--error-rate 0.0] [--groq-latency 0.6] [--tavily-latency 0.8]
+        [--page-latency 0.15] [--ingredient-kb] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+from functools import wraps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import start_fake_services, SAMPLE_INGREDIENTS  # noqa: E402
+from fake_groq_server import start_fake_groq_server, MARKDOWN_ANALYSIS  # noqa: E402
+
+STORES = ["Coles", "Woolworths", "Aldi"]
+PRODUCTS = ["chocolate biscuits", "orange juice", "shampoo", "ham", "pasta sauce", "muesli", "yoghurt", "chips"]
+# Saved-product queries answered from the sparse ingredient index alone
+INGREDIENT_QUERIES = ["sodium benzoate", "E250", "soy lecithin", "contains 476"]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+class StageTimer:
+    """Collects (seconds, ok) samples per stage name"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, ok=True):
+        with self._lock:
+            self.samples.setdefault(stage, []).append((seconds, ok))
+
+    def wrap(self, stage, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.record(stage, time.perf_counter() - start, ok=False)
+                raise
+            ok = not (isinstance(result, dict) and result.get("success") is False)
+            self.record(stage, time.perf_counter() - start, ok)
+            return result
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def summary(self, wall_seconds):
+        rows = {}
+        for stage, samples in self.samples.items():
+            durations = [seconds for seconds, _ in samples]
+            rows[stage] = {
+                "calls": len(samples),
+                "errors": sum(1 for _, ok in samples if not ok),
+                "p50_ms": percentile(durations, 0.50) * 1000,
+                "p95_ms": percentile(durations, 0.95) * 1000,
+                "per_second": len(samples) / wall_seconds if wall_seconds else 0.0
+            }
+        return rows
+
+
+def print_table(title, rows):
+    print(f"\n== {title} ==")
+    print(f"{'stage':<20}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'per sec':>10}")
+    for stage, row in rows.items():
+        print(f"{stage:<20}{row['calls']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['per_second']:>10.2f}")
+
+
+def configure_environment(args, services, groq_url):
+    os.environ["TAVILY_BASE_URL"] = services.base_url
+    os.environ["TAVILY_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = groq_url
+    os.environ["GROQ_API_KEY"] = "bench"
+    # The fake Groq API does not rate limit, so neither should the scheduler
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "100000000")
+    # Every sample list is in the ingredient database, which would skip Groq entirely
+    os.environ["INGREDIENT_KB"] = "on" if args.ingredient_kb else "off"
+    os.environ["INNGEST_EVENT_KEY"] = "bench"
+    os.environ["INNGEST_EVENT_API_BASE_URL"] = services.base_url
+    os.environ.setdefault("INNGEST_FLUSH_INTERVAL", "0.5")
+    scratch = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ["CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.environ["QDRANT_PATH"] = os.path.join(scratch, "qdrant")
+    os.environ.pop("QDRANT_URL", None)
+
+
+def instrument(timer):
+    """Time each external stage where the app calls it"""
+    import search_agent
+    import page_fetcher
+    import groq_analyzer
+    import inngest_monitor
+
+    search_agent._fetch_tavily_results = timer.wrap("tavily", search_agent._fetch_tavily_results)
+    page_fetcher.fetch_product_image = timer.wrap("page_fetch", page_fetcher.fetch_product_image)
+    groq_analyzer.scheduler.create = timer.wrap("groq", groq_analyzer.scheduler.create)
+    inngest_monitor.dispatcher._send = timer.wrap("inngest_send", inngest_monitor.dispatcher._send)
+
+
+def run_searches(timer, descriptions):
+    from search_agent import search_products_with_web_search
+    from inngest_monitor import dispatcher
+
+    search = timer.wrap("search", search_products_with_web_search)
+    start = time.perf_counter()
+    for description in descriptions:
+        search(description, STORES)
+    dispatcher.flush()
+    return time.perf_counter() - start
+
+
+def seed_collection(target_size):
+    """Grow the collection to target_size with synthetic analysed products"""
+    from qdrant_manager import save_products_to_qdrant, get_collection_stats
+
+    current = get_collection_stats().get("total_products", 0)
+    products = []
+    for i in range(current, target_size):
+        store = STORES[i % len(STORES)]
+        products.append({
+            "title": f"Seed product {i} {PRODUCTS[i % len(PRODUCTS)]}",
+            "url": f"https://www.{store.lower()}.com.au/product/seed-{i}",
+            "content": f"Ingredients: {SAMPLE_INGREDIENTS[i % len(SAMPLE_INGREDIENTS)]}",
+            "store": store,
+            "product_description": PRODUCTS[i % len(PRODUCTS)],
+            "groq_analysis": MARKDOWN_ANALYSIS
+        })
+    for start in range(0, len(products), 256):
+        save_products_to_qdrant(products[start:start + 256])
+
+
+def run_collection(timer, size, operations):
+    from qdrant_manager import save_product_to_qdrant, search_similar_products
+
+    save = timer.wrap("qdrant_save", lambda product: {"success": save_product_to_qdrant(product)[0]})
+    search = timer.wrap("qdrant_search", search_similar_products)
+    filtered = timer.wrap("qdrant_search_filtered", search_similar_products)
+    ingredient = timer.wrap("qdrant_search_ingredient", search_similar_products)
+
+    start = time.perf_counter()
+    for i in range(operations):
+        save({
+            "title": f"Benchmark product {size}-{i}",
+            "url": f"https://www.coles.com.au/product/bench-{size}-{i}",
+            "content": f"Ingredients: {SAMPLE_INGREDIENTS[i % len(SAMPLE_INGREDIENTS)]}",
+            "store": "Coles",
+            "product_description": "benchmark",
+            "groq_analysis": MARKDOWN_ANALYSIS
+        })
+    for i in range(operations):
+        query = f"{PRODUCTS[i % len(PRODUCTS)]} without preservatives {i}"
+        search(query, limit=5)
+        filtered(query, limit=5, stores=["Coles", "Aldi"], exclude_risk_levels=["HIGH"])
+        ingredient(INGREDIENT_QUERIES[i % len(INGREDIENT_QUERIES)], limit=5)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", default="3,10", help="Comma-separated Tavily result counts")
+    parser.add_argument("--collection-sizes", default="100,1000", help="Comma-separated Qdrant collection sizes")
+    parser.add_argument("--searches", type=int, default=5, help="Searches per result count")
+    parser.add_argument("--operations", type=int, default=20, help="Saves and queries per collection size")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Error rate of every fake service")
+    parser.add_argument("--tavily-latency", type=float, default=0.8)
+    parser.add_argument("--groq-latency", type=float, default=0.6)
+    parser.add_argument("--page-latency", type=float, default=0.15)
+    parser.add_argument("--inngest-latency", type=float, default=0.05)
+    parser.add_argument("--ingredient-kb", action="store_true",
+                        help="Score products from the local ingredient database instead of Groq")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    server, services = start_fake_services()
+    services.tavily.latency, services.tavily.error_rate = args.tavily_latency, args.error_rate
+    services.pages.latency, services.pages.error_rate = args.page_latency, args.error_rate
+    services.inngest.latency, services.inngest.error_rate = args.inngest_latency, args.error_rate
+    groq_server, groq_state, groq_url = start_fake_groq_server(latency=args.groq_latency, error_rate=args.error_rate)
+    configure_environment(args, services, groq_url)
+
+    timer = StageTimer()
+    instrument(timer)
+    report = {}
+
+    from qdrant_manager import get_model
+    get_model()
+
+    for result_count in [int(n) for n in args.results.split(",") if n]:
+        services.result_count = result_count
+        descriptions = [f"{PRODUCTS[i % len(PRODUCTS)]} {result_count}-{i}" for i in range(args.searches)]
+        for phase in ("cold", "warm"):
+            timer.reset()
+            wall = run_searches(timer, descriptions)
+            title = f"search, {result_count} results, {phase}"
+            report[title] = timer.summary(wall)
+            print_table(title, report[title])
+
+    for size in [int(n) for n in args.collection_sizes.split(",") if n]:
+        seed_collection(size)
+        timer.reset()
+        wall = run_collection(timer, size, args.operations)
+        title = f"qdrant, {size} products"
+        report[title] = timer.summary(wall)
+        print_table(title, report[title])
+
+    print(f"\nfake services: {services.stats()}, groq: {groq_state.stats()}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    from qdrant_manager import get_qdrant_client
+    get_qdrant_client().close()
+    server.shutdown()
+    groq_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
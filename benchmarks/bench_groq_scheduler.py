@@ -0,0 +1,98 @@
+"""
+Load test for the Groq request scheduler against the local fake Groq API.
+
+Simulates several sessions analysing the same products at the same time on a
+server that rate limits and occasionally fails. Reports how many analyses
+were lost, and how many API calls, retries and coalesced requests it took,
+with and without the scheduler.
+
+Usage:
+    python benchmarks/bench_groq_scheduler.py [--products 20] [--sessions 3] [--rpm 40] [--error-rate 0.1]
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_groq_server import start_fake_groq_server  # noqa: E402
+
+
+def run(label, analyze, jobs, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda job: analyze(*job), jobs))
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for result in results if result.get("success"))
+    print(f"{label:<18} {succeeded:>4}/{len(jobs)} analysed   {len(jobs) - succeeded:>4} lost   {elapsed:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=3, help="Concurrent sessions analysing each product")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--rpm", type=int, default=40, help="Fake server requests-per-minute limit")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_groq_server(latency=args.latency, rpm=args.rpm, error_rate=args.error_rate)
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_groq_")
+    # Leave some headroom below the server's limit
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", str(max(1, args.rpm - 5)))
+    # Measure the scheduler alone, without the triage step or the ingredient database
+    os.environ.setdefault("ANALYSIS_ROUTING", "direct")
+    os.environ["INGREDIENT_KB"] = "off"
+
+    import groq_analyzer
+    from groq import Groq
+
+    run_id = int(time.time())
+    jobs = [
+        (f"Product {run_id}-{i}", "sugar, palm oil, sodium benzoate", "Coles")
+        for i in range(args.products)
+        for _ in range(args.sessions)
+    ]
+    workers = args.products * args.sessions
+
+    print(f"{len(jobs)} analyses ({args.products} products x {args.sessions} sessions), "
+          f"server limit {args.rpm} rpm, {args.error_rate:.0%} errors\n")
+
+    # Baseline: one direct call per analysis, no retries, no coalescing
+    raw_client = Groq(api_key=os.environ["GROQ_API_KEY"], max_retries=0)
+
+    def analyze_direct(title, ingredients, store):
+        try:
+            raw_client.chat.completions.create(
+                model=groq_analyzer.ANALYSIS_MODEL,
+                messages=[{"role": "user", "content": f"{title}: {ingredients}"}],
+                max_tokens=2000
+            )
+            return {"success": True}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    run("direct", analyze_direct, jobs, workers)
+    print(f"{'':<18} server: {state.stats()}\n")
+
+    # Let the fake server's rate window drain before the scheduled run
+    state._recent.clear()
+    before = state.stats()
+    jobs = [(title + "-scheduled", ingredients, store) for title, ingredients, store in jobs]
+    run("scheduler", groq_analyzer.analyze_ingredients_with_groq, jobs, workers)
+    after = state.stats()
+    print(f"{'':<18} server: { {k: after[k] - before[k] for k in after} }")
+    print(f"{'':<18} scheduler: {groq_analyzer.get_scheduler_stats()}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Micro-benchmark for ingredient_analyzer.extract_harmful_ingredients.
+
+Runs the current scanner (lowercases and splits the analysis once and only
+walks the harmful section) and the previous implementation (kept below as a
+baseline; it re-lowercases every line and re-splits the section) over a
+corpus of generated analyses shaped like real Groq output. It checks both
+return identical results, then reports throughput.
+
+Usage:
+    python benchmarks/bench_risk_scanner.py [--docs 2000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_analyzer import extract_harmful_ingredients  # noqa: E402
+
+INGREDIENTS = [
+    "Sugar", "Milk Solids", "Wheat Flour", "Vegetable Oil (Palm)", "Salt", "Emulsifier (Soy Lecithin)",
+    "Sodium Benzoate (E211)", "Monosodium Glutamate (E621)", "Tartrazine (E102)", "Sunset Yellow (E110)",
+    "Aspartame (E951)", "Potassium Sorbate (E202)", "Carrageenan (E407)", "Natural Flavour", "Cocoa Mass",
+    "Glucose Syrup", "Maltodextrin", "Citric Acid (E330)", "Sodium Nitrite (E250)", "BHA (E320)", "Water"
+]
+RISK_TIERS = ["HIGH RISK", "MODERATE RISK", "LOW RISK"]
+
+
+def make_analysis(rng):
+    """Build one six-section analysis in the format the Groq prompt asks for"""
+    items = rng.sample(INGREDIENTS, rng.randint(3, 10))
+    lines = ["1. **INGREDIENTS BREAKDOWN:**"]
+    for item in items:
+        lines.append(f"   - {item}: commonly used as a {rng.choice(['sweetener', 'preservative', 'thickener', 'flavour enhancer', 'base ingredient'])}.")
+    lines.append("")
+    lines.append("2. **HARMFUL/CONCERNING INGREDIENTS:**")
+    flagged = [item for item in items if "(E" in item and rng.random() < 0.7]
+    if not flagged and rng.random() < 0.5:
+        lines.append("   ✅ No harmful ingredients detected")
+    for item in flagged:
+        tier = rng.choice(RISK_TIERS)
+        lines.append(f"   - ⚠️ {item} - {tier}: linked to {rng.choice(['hyperactivity in children', 'allergic reactions', 'digestive upset', 'headaches'])}.")
+    lines.append("")
+    lines.append("3. **ALLERGENS:**")
+    lines.append(f"   - {rng.choice(['Milk', 'Soy', 'Wheat (gluten)', 'None declared'])}")
+    lines.append("")
+    lines.append("4. **ADDITIVES & PRESERVATIVES:**")
+    for item in items:
+        if "(E" in item:
+            lines.append(f"   - {item}: generally recognised as safe at permitted levels.")
+    lines.append("")
+    lines.append("5. **HEALTH CONSIDERATIONS:**")
+    lines.append(f"   - People with {rng.choice(['diabetes', 'asthma', 'coeliac disease'])} should {rng.choice(['avoid', 'limit'])} this product.")
+    lines.append("")
+    lines.append("6. **DIETARY SUITABILITY:**")
+    lines.append(f"   - {rng.choice(['Vegetarian', 'Not vegan', 'Vegan'])}; {rng.choice(['contains gluten', 'gluten-free'])}.")
+    return "\n".join(lines)
+
+
+# Previous implementation, kept as the baseline
+
+def legacy_extract_harmful_ingredients(groq_analysis):
+    """
+    Extract harmful ingredients from Groq analysis for quick display
+    
+    Args:
+        groq_analysis: The analysis text from Groq
+    
+    Returns:
+        Dict with harmful ingredients summary
+    """
+    
+    if not groq_analysis:
+        return {
+            "has_harmful": False,
+            "harmful_list": [],
+            "risk_level": "UNKNOWN"
+        }
+    
+    # Look for harmful ingredients section
+    harmful_section = ""
+    analysis_lower = groq_analysis.lower()
+    
+    # Find harmful/concerning section
+    if "harmful" in analysis_lower or "concerning" in analysis_lower:
+        # Try to extract the harmful section
+        lines = groq_analysis.split('\n')
+        in_harmful_section = False
+        harmful_lines = []
+        
+        for line in lines:
+            line_lower = line.lower()
+            
+            # Start of harmful section
+            if any(keyword in line_lower for keyword in ['harmful', 'concerning ingredients', 'risk']):
+                in_harmful_section = True
+                harmful_lines.append(line)
+            elif in_harmful_section:
+                # Check if we've moved to next section
+                if line.strip().startswith('##') or line.strip().startswith('**') and ':' in line:
+                    if not any(keyword in line_lower for keyword in ['harmful', 'concerning', 'risk']):
+                        break
+                harmful_lines.append(line)
+        
+        harmful_section = '\n'.join(harmful_lines)
+    
+    # Determine if there are harmful ingredients
+    has_harmful = False
+    harmful_list = []
+    risk_level = "LOW"
+    
+    if "no harmful" in analysis_lower or "no concerning" in analysis_lower or "✅" in groq_analysis:
+        has_harmful = False
+        risk_level = "SAFE"
+    elif "high risk" in analysis_lower:
+        has_harmful = True
+        risk_level = "HIGH"
+        # Extract ingredients marked as high risk
+        for line in harmful_section.split('\n'):
+            if "high risk" in line.lower() or "⚠️" in line:
+                harmful_list.append(line.strip())
+    elif "moderate risk" in analysis_lower or "⚠️" in groq_analysis:
+        has_harmful = True
+        risk_level = "MODERATE"
+        for line in harmful_section.split('\n'):
+            if "moderate risk" in line.lower() or "risk" in line.lower():
+                harmful_list.append(line.strip())
+    elif any(keyword in analysis_lower for keyword in ['avoid', 'warning', 'concerning', 'harmful', 'toxic', 'dangerous']):
+        has_harmful = True
+        risk_level = "MODERATE"
+    
+    return {
+        "has_harmful": has_harmful,
+        "harmful_list": harmful_list[:5],  # Top 5 harmful ingredients
+        "risk_level": risk_level,
+        "harmful_section": harmful_section[:500] if harmful_section else ""
+    }
+
+
+def run(func, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [make_analysis(rng) for _ in range(args.docs)]
+
+    mismatches = sum(
+        1 for text in corpus
+        if extract_harmful_ingredients(text) != legacy_extract_harmful_ingredients(text)
+    )
+    if mismatches:
+        print(f"WARNING: {mismatches} analyses scored differently from the baseline")
+
+    legacy = run(legacy_extract_harmful_ingredients, corpus, args.repeat)
+    current = run(extract_harmful_ingredients, corpus, args.repeat)
+    for name, seconds in [("baseline", legacy), ("current", current)]:
+        print(f"{name:<20}{seconds * 1000:>10.1f} ms  {len(corpus) / seconds:>12.0f} analyses/s")
+    print(f"speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cold-start benchmark for the app's backend modules.
+
+Each run imports the modules in a fresh interpreter, so nothing is shared
+between samples. The lazy resources (embedding model, Qdrant, Groq, Tavily)
+are then built one by one and timed separately.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--with-resources]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+timings = {}
+start = time.perf_counter()
+import search_agent, qdrant_manager, groq_analyzer, inngest_monitor
+timings["import"] = time.perf_counter() - start
+if WITH_RESOURCES:
+    for name, factory in [
+        ("qdrant_client", qdrant_manager.get_qdrant_client),
+        ("embedding_model", qdrant_manager.get_model),
+        ("groq_client", groq_analyzer.get_groq_client),
+        ("tavily_client", search_agent.get_tavily_client),
+    ]:
+        t = time.perf_counter()
+        factory()
+        timings[name] = time.perf_counter() - t
+print("TIMINGS " + json.dumps(timings))
+"""
+
+
+def run_once(with_resources):
+    env = dict(os.environ)
+    # Never touch the real database while benchmarking
+    env.setdefault("QDRANT_PATH", ":memory:")
+    code = PROBE.replace("WITH_RESOURCES", str(with_resources))
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("TIMINGS "):
+            return json.loads(line[len("TIMINGS "):])
+    raise RuntimeError(f"Startup probe failed:\n{proc.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--with-resources", action="store_true",
+                        help="also time building the lazy model and clients")
+    args = parser.parse_args()
+
+    samples = [run_once(args.with_resources) for _ in range(args.runs)]
+    print(f"{'stage':<18}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for stage in samples[0]:
+        values = [sample[stage] * 1000 for sample in samples]
+        print(f"{stage:<18}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Answers OpenAI-style chat completion requests after a configurable delay and
+enforces its own requests-per-minute limit with 429 responses, so the
+scheduler's throttling, retries and coalescing can be exercised without an
+API key or network access. Requests with `response_format` set to
+`json_object` get a JSON analysis, everything else a markdown one; batched
+analysis prompts get one analysis per product in the batched format,
+triage prompts get a verdict per product (flagged when its ingredients
+mention an additive) and ingredient verdict prompts one per ingredient.
+Small "instant" models answer in `--triage-latency`.
+
+Usage:
+    python benchmarks/fake_groq_server.py [--port 8787] [--latency 0.3] [--rpm 30] [--error-rate 0.1]
+
+Then point the app at it:
+    GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_API_KEY=fake streamlit run app.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MARKDOWN_ANALYSIS = """1. **INGREDIENTS BREAKDOWN:**
+   - Sugar - sweetener
+   - Palm oil - fat
+   - Sodium benzoate (E211) - preservative
+
+2. **HARMFUL/CONCERNING INGREDIENTS:**
+   - ⚠️ Sodium benzoate - MODERATE RISK - can form benzene with vitamin C
+   - ⚠️ Palm oil - LOW RISK - high in saturated fat
+
+3. **ALLERGENS:**
+   - May contain milk
+
+4. **ADDITIVES & PRESERVATIVES:**
+   - E211 sodium benzoate
+
+5. **HEALTH CONSIDERATIONS:**
+   - High in sugar
+
+6. **DIETARY SUITABILITY:**
+   - Vegetarian, not certified gluten free
+"""
+
+STRUCTURED_ANALYSIS = {
+    "ingredients": [
+        {"name": "Sugar", "purpose": "sweetener"},
+        {"name": "Palm oil", "purpose": "fat"},
+        {"name": "Sodium benzoate", "purpose": "preservative"}
+    ],
+    "risks": [
+        {"ingredient": "Sodium benzoate", "severity": "MODERATE", "reason": "can form benzene with vitamin C"},
+        {"ingredient": "Palm oil", "severity": "LOW", "reason": "high in saturated fat"}
+    ],
+    "allergens": ["milk"],
+    "additives": [{"name": "Sodium benzoate", "e_number": "E211", "note": "preservative"}],
+    "dietary": {"vegan": False, "vegetarian": True, "gluten_free": None, "notes": ""},
+    "health_notes": ["High in sugar"]
+}
+
+
+_BATCH_PRODUCT_RE = re.compile(r'^\*\*Product (\d+):\*\*', re.M)
+_INGREDIENTS_LINE_RE = re.compile(r'^Ingredients/Details: (.*)$', re.M)
+# Ingredient words the fake triage treats as needing a full review
+_FLAGGED_WORDS = ("benzoate", "nitrite", "colour", "color", "flavour", "sweetener", "e1", "e2", "e3", "e4", "e6", "e9")
+
+
+def _triage_content(prompt):
+    products = []
+    for idx, ingredients in enumerate(_INGREDIENTS_LINE_RE.findall(prompt), 1):
+        lowered = ingredients.lower()
+        flagged = not ingredients.strip() or any(word in lowered for word in _FLAGGED_WORDS)
+        products.append({
+            "id": idx,
+            "needs_review": flagged,
+            "reason": "Contains additives" if flagged else "Simple whole-food ingredients",
+            "ingredients": [part.strip() for part in ingredients.split(",") if part.strip()],
+            "allergens": ["milk"] if "milk" in lowered else []
+        })
+    return json.dumps({"products": products})
+
+
+_LISTED_NAME_RE = re.compile(r'^(\d+)\. (.+)$', re.M)
+
+
+def _verdict_content(prompt):
+    ingredients = []
+    for number, name in _LISTED_NAME_RE.findall(prompt):
+        flagged = any(word in name.lower() for word in _FLAGGED_WORDS)
+        ingredients.append({
+            "id": int(number),
+            "is_ingredient": True,
+            "tier": "MODERATE" if flagged else "SAFE",
+            "purpose": "additive" if flagged else "ingredient",
+            "note": "Contains additives" if flagged else "No known concerns",
+            "e_number": "",
+            "allergens": [],
+            "animal": None
+        })
+    return json.dumps({"ingredients": ingredients})
+
+
+def _completion_content(request):
+    """Answer in whichever format the prompt asked for"""
+    prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+    batch = len(_BATCH_PRODUCT_RE.findall(prompt)) if "Analyze" in prompt else 0
+    as_json = (request.get("response_format") or {}).get("type") == "json_object"
+    if as_json and '"needs_review"' in prompt:
+        return _triage_content(prompt)
+    if as_json and '"is_ingredient"' in prompt:
+        return _verdict_content(prompt)
+    if batch and as_json and '"products"' in prompt:
+        return json.dumps({"products": [dict(STRUCTURED_ANALYSIS, id=i) for i in range(1, batch + 1)]})
+    if batch and "===== PRODUCT" in prompt:
+        return "\n".join(f"===== PRODUCT {i} =====\n{MARKDOWN_ANALYSIS}" for i in range(1, batch + 1))
+    return json.dumps(STRUCTURED_ANALYSIS) if as_json else MARKDOWN_ANALYSIS
+
+
+class FakeGroqState:
+    """Settings and counters shared by all request handlers"""
+
+    def __init__(self, latency=0.3, rpm=None, error_rate=0.0, triage_latency=None):
+        self.latency = latency
+        self.triage_latency = latency / 5 if triage_latency is None else triage_latency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.completions = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Return None to serve the request, or the error status to send"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                self.rate_limited += 1
+                return 429
+            self._recent.append(now)
+            if random.random() < self.error_rate:
+                self.server_errors += 1
+                return 503
+            return None
+
+    def stats(self):
+        return {
+            "completions": self.completions,
+            "rate_limited": self.rate_limited,
+            "server_errors": self.server_errors
+        }
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            status = state.admit()
+            if status == 429:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                                {"retry-after": "1"})
+                return
+            if status is not None:
+                self._send_json(status, {"error": {"message": "Service unavailable"}})
+                return
+
+            model = str(request.get("model", ""))
+            time.sleep(state.triage_latency if "instant" in model else state.latency)
+            content = _completion_content(request)
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+            completion_tokens = len(content) // 4
+            with state._lock:
+                state.completions += 1
+            self._send_json(200, {
+                "id": f"chatcmpl-fake-{state.completions}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            })
+
+    return Handler
+
+
+def start_fake_groq_server(port=0, latency=0.3, rpm=None, error_rate=0.0, triage_latency=None):
+    """
+    Start the fake server on a background thread.
+
+    Returns:
+        Tuple of (server, state, base_url); call server.shutdown() when done
+    """
+    state = FakeGroqState(latency=latency, rpm=rpm, error_rate=error_rate, triage_latency=triage_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per completion")
+    parser.add_argument("--triage-latency", type=float, default=None,
+                        help="Seconds per completion from *-instant models (default latency / 5)")
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_groq_server(args.port, args.latency, args.rpm or None, args.error_rate,
+                                                  args.triage_latency)
+    print(f"Fake Groq API listening on {base_url} (GROQ_BASE_URL={base_url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(state.stats())
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Local stand-ins for Tavily search, the Inngest event API and store product
+pages, served from one HTTP server.
+
+Every response is deterministic (derived from the request) so runs can be
+compared. Each service has its own latency and error rate.
+
+- POST /search              Tavily search: `result_count` results on the store
+                            domains named in the query, pointing at this server
+- GET  /<domain>/product/*  Store product page (sample HTML); every
+                            `body_image_every`-th page has its image only in
+                            the body, so the full page is parsed
+- POST /e/<event_key>       Inngest event API
+
+Point the app at it with TAVILY_BASE_URL and INNGEST_EVENT_API_BASE_URL (the
+Groq stand-in lives in fake_groq_server.py).
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Ingredient lists for generated products, from plain to heavily processed
+SAMPLE_INGREDIENTS = [
+    "Full cream milk",
+    "Rolled oats",
+    "Water, sugar, citric acid, sodium benzoate (211), natural flavours",
+    "Wheat flour, sugar, vegetable oil (palm), emulsifier (soy lecithin), raising agent (500), salt",
+    "Pork (85%), water, salt, dextrose, sodium nitrite (250), smoke flavour",
+    "Sugar, cocoa butter, milk solids, cocoa mass, emulsifiers (soy lecithin, 476), flavour",
+    "Tomatoes, water, olive oil, garlic, basil, salt",
+    "Aqua, sodium laureth sulfate, cocamidopropyl betaine, parfum, methylisothiazolinone, CI 42090"
+]
+
+PAGE_FILLER = "<p>" + "Product details, nutrition information and reviews. " * 40 + "</p>\n"
+
+
+class ServiceSettings:
+    """Latency (seconds) and error rate for one fake service, plus its counters"""
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def handle(self):
+        """Sleep for the configured latency; returns True if this request should fail"""
+        with self._lock:
+            self.requests += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(self.latency)
+        return failed
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors}
+
+
+class FakeServices:
+    """Settings shared by all request handlers"""
+
+    def __init__(self, result_count=10, body_image_every=4):
+        self.result_count = result_count
+        self.body_image_every = body_image_every
+        self.tavily = ServiceSettings(latency=0.8)
+        self.pages = ServiceSettings(latency=0.15)
+        self.inngest = ServiceSettings(latency=0.05)
+        self.events = 0
+        self.base_url = None
+
+    def stats(self):
+        return {
+            "tavily": self.tavily.stats(),
+            "pages": self.pages.stats(),
+            "inngest": dict(self.inngest.stats(), events=self.events)
+        }
+
+    def search_results(self, query, include_domains):
+        """Deterministic Tavily results for a query"""
+        squashed = query.lower().replace(" ", "")
+        domains = [d for d in include_domains if d.split(".")[0] in squashed] or include_domains or ["coles.com.au"]
+        seed = int(hashlib.sha256(query.encode("utf-8")).hexdigest()[:8], 16)
+        words = query.split(" price ")[0]
+        results = []
+        for i in range(self.result_count):
+            domain = domains[i % len(domains)]
+            ingredients = SAMPLE_INGREDIENTS[(seed + i) % len(SAMPLE_INGREDIENTS)]
+            results.append({
+                "title": f"{words.title()} {seed % 1000}-{i}",
+                "url": f"{self.base_url}/{domain}/product/{seed}-{i}",
+                "content": f"{words} from {domain}. Ingredients: {ingredients}. Store in a cool dry place.",
+                "score": round(1 - i / (self.result_count + 1), 3),
+                "raw_content": None
+            })
+        return results
+
+    def product_page(self, path):
+        """Sample product page HTML for a product path"""
+        number = int(hashlib.sha256(path.encode("utf-8")).hexdigest()[:8], 16)
+        image = f"{self.base_url}/images/{number}.jpg"
+        head_image = "" if number % self.body_image_every == 0 else f'<meta property="og:image" content="{image}">'
+        return (
+            "<!DOCTYPE html><html><head>\n"
+            f"<title>Product {number}</title>\n"
+            '<meta charset="utf-8"><link rel="stylesheet" href="/static/site.css">\n'
+            f"{head_image}\n</head><body>\n"
+            '<nav><a href="/">Home</a> <a href="/specials">Specials</a></nav>\n'
+            f"{PAGE_FILLER * 10}"
+            f'<img class="product-image" src="{image}" alt="product">\n'
+            f"{PAGE_FILLER * 10}"
+            "</body></html>\n"
+        )
+
+
+def _make_handler(services):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (ConnectionResetError, BrokenPipeError):
+                # The page fetcher hangs up once it has found an image
+                pass
+
+        def _send(self, status, body, content_type="application/json"):
+            payload = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_POST(self):
+            if self.path == "/search":
+                request = self._read_json()
+                if services.tavily.handle():
+                    self._send(500, {"detail": {"error": "Internal server error"}})
+                    return
+                results = services.search_results(request.get("query", ""), request.get("include_domains") or [])
+                self._send(200, {"query": request.get("query", ""), "results": results, "response_time": services.tavily.latency})
+            elif self.path.startswith("/e/"):
+                events = self._read_json()
+                if services.inngest.handle():
+                    self._send(500, {"error": "Internal server error"})
+                    return
+                count = len(events) if isinstance(events, list) else 1
+                services.events += count
+                self._send(200, {"ids": [f"evt-{services.events - i}" for i in range(count)], "status": 200})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            if "/product/" not in self.path:
+                self._send(404, "not found", "text/plain")
+                return
+            if services.pages.handle():
+                self._send(503, "Service unavailable", "text/plain")
+                return
+            self._send(200, services.product_page(self.path), "text/html; charset=utf-8")
+
+    return Handler
+
+
+def start_fake_services(port=0, result_count=10):
+    """
+    Start the fake Tavily / Inngest / store page server on a background thread.
+
+    Returns:
+        Tuple of (server, services); adjust services.tavily / .pages / .inngest
+        latency and error_rate at any time, and call server.shutdown() when done
+    """
+    services = FakeServices(result_count=result_count)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(services))
+    server.daemon_threads = True
+    services.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, services
@@ -0,0 +1,115 @@
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EnrichmentQueue:
+    """
+    Runs enrichment jobs (analysis, image lookup, saving) on a background
+    worker pool and keeps each job's per-product status for the UI to poll.
+
+    A job is a callable returning an iterator of iter_results_simple-style
+    events: {"type": "product", "index", ...} as products finish, then
+    {"type": "summary", ...}, optionally followed by {"type": "trace", ...}.
+    When a job is submitted and there are more than `max_jobs`, the oldest
+    finished jobs are dropped; running jobs are always kept.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=200):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="enrichment")
+            return self._executor
+
+    def submit(self, products, run):
+        """
+        Queue a job.
+
+        Args:
+            products: List of dicts with at least "index"; each starts out "pending"
+            run: Zero-argument callable returning the job's event iterator
+
+        Returns:
+            The job id to poll with status()
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "running",
+            "created": time.time(),
+            "finished": None,
+            "products": {product["index"]: dict(product, status="pending") for product in products},
+            "saved_count": 0,
+            "unchanged_count": 0,
+            "trace": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict()
+        # Each job records its spans in a fresh context, not the submitter's trace
+        self._get_executor().submit(contextvars.Context().run, self._run, job, run)
+        return job_id
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond max_jobs (called with the lock held)"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] != "running"]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job, run):
+        try:
+            for event in run():
+                with self._lock:
+                    if event["type"] == "product":
+                        product = job["products"].setdefault(event["index"], {"index": event["index"]})
+                        product.update(event, status="done")
+                        del product["type"]
+                    elif event["type"] == "summary":
+                        job["saved_count"] = event["saved_count"]
+                        job["unchanged_count"] = event["unchanged_count"]
+                    elif event["type"] == "trace":
+                        job["trace"] = event["trace"]
+            status, error = "done", None
+        except Exception as e:
+            print(f"Enrichment job {job['job_id']} failed: {e}")
+            status, error = "failed", str(e)
+        with self._lock:
+            for product in job["products"].values():
+                if product["status"] == "pending":
+                    product["status"] = "failed"
+            job["status"] = status
+            job["error"] = error
+            job["finished"] = time.time()
+
+    def status(self, job_id):
+        """
+        Snapshot of a job, or None if it is unknown (or was dropped).
+        "products" is a list in index order, each with a "status" of
+        pending, done or failed.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["products"] = [dict(job["products"][index]) for index in sorted(job["products"])]
+            return snapshot
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            return {"running": running, "finished": len(self._jobs) - running}
@@ -1,42 +1,81 @@
 import os
+import re
+import json
+import time
+import threading
 from groq import Groq
 from dotenv import load_dotenv
-from inngest_monitor import track_groq_analysis, track_groq_comparison, track_groq_qa
+from inngest_monitor import track_groq_analysis, track_groq_comparison, track_groq_qa, track_kb_analysis
+from result_cache import TwoTierCache, make_cache_key
+from lazy_resource import LazyResource
+from groq_scheduler import GroqScheduler
+from ingredient_analyzer import normalize_structured_analysis, render_structured_analysis
+from ingredient_kb import get_knowledge_base, build_structured_analysis
 
 load_dotenv()
 
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Built on first use, once per process. Retries are handled by the scheduler.
+_groq_client = LazyResource(lambda: Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0))
 
-def analyze_ingredients_with_groq(product_title, ingredients_text, store):
-    """
-    Use Groq's Llama model to analyze product ingredients
-    
-    Args:
-        product_title: Name of the product
-        ingredients_text: Raw ingredients text from product
-        store: Store name
-    
-    Returns:
-        Dict with analysis results
-    """
-    
-    if not os.getenv("GROQ_API_KEY"):
-        return {
-            "success": False,
-            "error": "Groq API key not found",
-            "analysis": None
-        }
-    
-    try:
-        prompt = f"""Analyze the following product and its ingredients in detail:
 
-Product: {product_title}
-Store: {store}
-Ingredients/Details: {ingredients_text}
+def get_groq_client():
+    """Shared Groq client"""
+    return _groq_client.get()
 
-Please provide a comprehensive analysis with the following structure:
 
-1. **INGREDIENTS BREAKDOWN:**
+# Every Groq call goes through this scheduler (rate limits, retries, coalescing)
+scheduler = GroqScheduler(
+    get_groq_client,
+    requests_per_minute=int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+    tokens_per_minute=int(os.getenv("GROQ_TOKENS_PER_MINUTE", "12000")),
+    max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "4")),
+    max_retries=int(os.getenv("GROQ_MAX_RETRIES", "4"))
+)
+
+
+def get_scheduler_stats():
+    """Call, retry, coalescing and throttling counters for Groq requests"""
+    return scheduler.stats()
+
+
+ANALYSIS_MODEL = "llama-3.3-70b-versatile"
+
+# Bump whenever the analysis prompt changes so stale analyses are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+STRUCTURED_PROMPT_VERSION = "json-1"
+
+# "markdown" asks for the six-section essay, "json" for a compact structured
+# analysis that is rendered back to the same markdown locally
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "markdown")
+STRUCTURED_MAX_TOKENS = int(os.getenv("STRUCTURED_MAX_TOKENS", "700"))
+
+# Output budget per product in a batched markdown request. Unused tokens are
+# refunded to the rate limiter, but the whole budget is reserved up front.
+BATCH_MARKDOWN_MAX_TOKENS = int(os.getenv("BATCH_MARKDOWN_MAX_TOKENS", "900"))
+
+# Products analysed per Groq request during a search (1 = one request per product)
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "5"))
+
+# "tiered" screens products with the small TRIAGE_MODEL first and only sends
+# flagged or unclear ones to ANALYSIS_MODEL; "direct" always uses ANALYSIS_MODEL
+ANALYSIS_ROUTING = os.getenv("ANALYSIS_ROUTING", "tiered")
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "llama-3.1-8b-instant")
+TRIAGE_MAX_TOKENS = int(os.getenv("TRIAGE_MAX_TOKENS", "250"))
+TRIAGE_PROMPT_VERSION = "triage-1"
+
+# "on" scores products whose ingredients are all in the local knowledge base
+# without a model, and asks Groq only about the ingredients it does not know;
+# products with more than KB_MAX_UNKNOWN unknown ingredients get a full analysis
+INGREDIENT_KB = os.getenv("INGREDIENT_KB", "on")
+KB_MAX_UNKNOWN = int(os.getenv("KB_MAX_UNKNOWN", "6"))
+KB_MODEL = "ingredient-kb"
+
+TRIAGE_SYSTEM_PROMPT = "You are a product safety screener. You decide quickly whether a product's ingredients need a detailed review by a toxicologist. When in doubt, send the product for review. Always answer with valid JSON only."
+
+ANALYSIS_SYSTEM_PROMPT = "You are an expert toxicologist and nutritionist who specializes in food safety and ingredient analysis. Your primary focus is identifying harmful, controversial, or potentially dangerous ingredients in products. Be thorough and err on the side of caution when identifying risks. Provide clear, evidence-based warnings about harmful substances."
+
+# Six-section layout of the markdown analysis, shared by single and batched prompts
+ANALYSIS_SECTIONS = """1. **INGREDIENTS BREAKDOWN:**
    - List each ingredient identified
    - For EACH ingredient, explain what it is and its purpose
 
@@ -66,12 +105,190 @@ Please provide a comprehensive analysis with the following structure:
 
 Be specific about harmful ingredients. If any ingredient has known health risks, regulatory warnings, or is banned in certain countries, mention it explicitly."""
 
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+STRUCTURED_SCHEMA = """{
+  "ingredients": [{"name": str, "purpose": str}],
+  "risks": [{"ingredient": str, "severity": "HIGH" | "MODERATE" | "LOW", "reason": str}],
+  "allergens": [str],
+  "additives": [{"name": str, "e_number": str, "note": str}],
+  "dietary": {"vegan": bool | null, "vegetarian": bool | null, "gluten_free": bool | null, "notes": str},
+  "health_notes": [str]
+}"""
+
+# Cache of successful ingredient analyses, shared across sessions and restarts
+analysis_cache = TwoTierCache(
+    "groq_analysis",
+    ttl=int(os.getenv("ANALYSIS_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "20000"))
+)
+
+
+def get_analysis_cache_stats():
+    """Hit/miss counters for the ingredient analysis cache"""
+    return analysis_cache.stats()
+
+
+class RoutingStats:
+    """Analyses per route, and the time the triage step saved over the deep analysis"""
+    
+    def __init__(self):
+        self.local = 0
+        self.triaged = 0
+        self.escalated = 0
+        self.deep_calls = 0
+        self.deep_seconds = 0.0
+        self.triage_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+    
+    def _average_deep_seconds(self):
+        return self.deep_seconds / self.deep_calls if self.deep_calls else None
+    
+    def _record_saved(self, seconds):
+        average = self._average_deep_seconds()
+        if average is None:
+            return None
+        saved = average - seconds
+        self.saved_seconds += saved
+        return round(saved, 3)
+    
+    def record_triage(self, seconds):
+        """A product settled by triage alone; returns the estimated seconds saved (None until a deep analysis has been timed)"""
+        with self._lock:
+            self.triaged += 1
+            self.triage_seconds += seconds
+            return self._record_saved(seconds)
+    
+    def record_local(self, seconds):
+        """A product scored from the ingredient knowledge base; returns the estimated seconds saved"""
+        with self._lock:
+            self.local += 1
+            return self._record_saved(seconds)
+    
+    def record_deep(self, seconds, triage_seconds=0.0):
+        """A deep analysis, after `triage_seconds` spent in a triage that flagged it"""
+        with self._lock:
+            self.deep_calls += 1
+            self.deep_seconds += seconds
+            if triage_seconds:
+                self.escalated += 1
+                self.triage_seconds += triage_seconds
+                self.saved_seconds -= triage_seconds
+    
+    def stats(self):
+        with self._lock:
+            average = self._average_deep_seconds()
+            return {
+                "local": self.local,
+                "triaged": self.triaged,
+                "escalated": self.escalated,
+                "deep": self.deep_calls,
+                "avg_deep_seconds": round(average, 3) if average is not None else None,
+                "saved_seconds": round(self.saved_seconds, 2)
+            }
+
+
+routing_stats = RoutingStats()
+
+
+def get_routing_stats():
+    """How many analyses the knowledge base or triage settled, how many went to the deep model, and the time saved"""
+    return routing_stats.stats()
+
+
+def _analysis_cache_key(product_title, ingredients_text, mode):
+    # Identical products are analysed once; the store is not part of the key
+    version = STRUCTURED_PROMPT_VERSION if mode == "json" else ANALYSIS_PROMPT_VERSION
+    return make_cache_key(product_title, ingredients_text, version, ANALYSIS_MODEL)
+
+
+def analyze_ingredients_with_groq(product_title, ingredients_text, store, mode=None, routing=None):
+    """
+    Use Groq's Llama model to analyze product ingredients
+    
+    Args:
+        product_title: Name of the product
+        ingredients_text: Raw ingredients text from product
+        store: Store name
+        mode: "markdown" or "json" (defaults to ANALYSIS_MODE)
+        routing: "tiered" or "direct" (defaults to ANALYSIS_ROUTING)
+    
+    Returns:
+        Dict with analysis results; "route" is "kb", "triage" or "deep"
+        unless the analysis came from the cache
+    """
+    mode = mode or ANALYSIS_MODE
+    triage_seconds = 0.0
+    product = {"title": product_title, "ingredients": ingredients_text, "store": store}
+    deep_cached = analysis_cache.get(_analysis_cache_key(product_title, ingredients_text, mode), count_stats=False) is not None
+    if not deep_cached and INGREDIENT_KB == "on":
+        kb_result = knowledge_base_results([product])[0]
+        if kb_result is not None:
+            return kb_result
+    
+    if not deep_cached and (routing or ANALYSIS_ROUTING) == "tiered":
+        start = time.perf_counter()
+        triage = triage_products([product])[0]
+        triage_seconds = time.perf_counter() - start
+        if triage is not None and not triage["needs_review"]:
+            return _triaged_result(product, triage, triage_seconds)
+    
+    return _deep_analysis(product_title, ingredients_text, store, mode, triage_seconds)
+
+
+def _deep_analysis(product_title, ingredients_text, store, mode, triage_seconds=0.0):
+    """Full analysis with ANALYSIS_MODEL, timed for the routing stats"""
+    start = time.perf_counter()
+    if mode == "json":
+        result = analyze_ingredients_structured(product_title, ingredients_text, store)
+    else:
+        result = analyze_ingredients_markdown(product_title, ingredients_text, store)
+    if result.get("success") and not result.get("cached"):
+        routing_stats.record_deep(time.perf_counter() - start, triage_seconds)
+        result["route"] = "deep"
+    return result
+
+
+def analyze_ingredients_markdown(product_title, ingredients_text, store):
+    """
+    Six-section markdown analysis with ANALYSIS_MODEL (no triage)
+    
+    Returns:
+        Dict with analysis results
+    """
+    cache_key = _analysis_cache_key(product_title, ingredients_text, "markdown")
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return {
+            "success": True,
+            "analysis": cached,
+            "model": ANALYSIS_MODEL,
+            "cached": True
+        }
+    
+    if not os.getenv("GROQ_API_KEY"):
+        return {
+            "success": False,
+            "error": "Groq API key not found",
+            "analysis": None
+        }
+    
+    try:
+        prompt = f"""Analyze the following product and its ingredients in detail:
+
+Product: {product_title}
+Store: {store}
+Ingredients/Details: {ingredients_text}
+
+Please provide a comprehensive analysis with the following structure:
+
+{ANALYSIS_SECTIONS}"""
+
+        response = scheduler.create(
+            model=ANALYSIS_MODEL,
             messages=[
                 {
                     "role": "system",
-                    "content": "You are an expert toxicologist and nutritionist who specializes in food safety and ingredient analysis. Your primary focus is identifying harmful, controversial, or potentially dangerous ingredients in products. Be thorough and err on the side of caution when identifying risks. Provide clear, evidence-based warnings about harmful substances."
+                    "content": ANALYSIS_SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -83,14 +300,17 @@ Be specific about harmful ingredients. If any ingredient has known health risks,
         )
         
         analysis = response.choices[0].message.content
+        if analysis:
+            analysis_cache.set(cache_key, analysis)
         
         # Track with Inngest
-        track_groq_analysis(product_title, store, True)
+        track_groq_analysis(product_title, store, True, route="deep")
         
         return {
             "success": True,
             "analysis": analysis,
-            "model": "llama-3.3-70b-versatile"
+            "model": ANALYSIS_MODEL,
+            "cached": False
         }
         
     except Exception as e:
@@ -104,6 +324,490 @@ Be specific about harmful ingredients. If any ingredient has known health risks,
         }
 
 
+def analyze_ingredients_structured(product_title, ingredients_text, store):
+    """
+    Analyze product ingredients as compact JSON instead of a markdown essay.
+    Much fewer output tokens, and risk levels are read exactly from the
+    result instead of keyword heuristics.
+    
+    Returns:
+        Dict like analyze_ingredients_with_groq, plus "structured" with the
+        normalized JSON (see ingredient_analyzer.normalize_structured_analysis).
+        "analysis" holds the same data rendered as markdown.
+    """
+    cache_key = _analysis_cache_key(product_title, ingredients_text, "json")
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return {
+            "success": True,
+            "analysis": render_structured_analysis(cached),
+            "structured": cached,
+            "model": ANALYSIS_MODEL,
+            "cached": True
+        }
+    
+    if not os.getenv("GROQ_API_KEY"):
+        return {
+            "success": False,
+            "error": "Groq API key not found",
+            "analysis": None
+        }
+    
+    try:
+        prompt = f"""Analyze this product's ingredients.
+
+Product: {product_title}
+Store: {store}
+Ingredients/Details: {ingredients_text}
+
+Respond with a single JSON object matching this schema:
+{STRUCTURED_SCHEMA}
+
+List every potentially harmful, controversial or banned ingredient in "risks" with its severity; use an empty list if there are none. Keep each text field to one short sentence."""
+
+        response = scheduler.create(
+            model=ANALYSIS_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": ANALYSIS_SYSTEM_PROMPT + " Always answer with valid JSON only."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.2,
+            max_tokens=STRUCTURED_MAX_TOKENS,
+            response_format={"type": "json_object"}
+        )
+        
+        data = normalize_structured_analysis(json.loads(response.choices[0].message.content))
+        analysis_cache.set(cache_key, data)
+        
+        # Track with Inngest
+        track_groq_analysis(product_title, store, True, route="deep")
+        
+        return {
+            "success": True,
+            "analysis": render_structured_analysis(data),
+            "structured": data,
+            "model": ANALYSIS_MODEL,
+            "cached": False
+        }
+        
+    except Exception as e:
+        # Track error with Inngest
+        track_groq_analysis(product_title, store, False, error=e)
+        
+        return {
+            "success": False,
+            "error": str(e),
+            "analysis": None
+        }
+
+
+_PRODUCT_MARKER_RE = re.compile(r'^[ \t]*=+[ \t]*PRODUCT[ \t]+(\d+)[ \t]*=+[ \t]*$', re.M | re.I)
+
+
+def _products_prompt_text(products):
+    text = ""
+    for idx, prod in enumerate(products, 1):
+        text += f"\n**Product {idx}:** {prod['title']}\n"
+        text += f"Store: {prod['store']}\n"
+        text += f"Ingredients/Details: {prod['ingredients']}\n"
+        text += "---\n"
+    return text
+
+
+def _split_markdown_batch(content, count, truncated=False):
+    """
+    Split a batched markdown answer on its ===== PRODUCT n ===== lines.
+    When the answer ran out of tokens (truncated), its last product is cut
+    short and left as None.
+    """
+    analyses = [None] * count
+    markers = list(_PRODUCT_MARKER_RE.finditer(content))
+    if truncated and markers:
+        # Keep the last marker as the end of the section before it
+        markers, content = markers[:-1], content[:markers[-1].start()]
+    for i, marker in enumerate(markers):
+        number = int(marker.group(1))
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
+        analysis = content[marker.end():end].strip()
+        # A section without the harmful-ingredients heading is not a usable analysis
+        if 1 <= number <= count and "HARMFUL" in analysis.upper():
+            analyses[number - 1] = analysis
+    return analyses
+
+
+def _split_json_batch(content, count):
+    """Pick the per-product objects out of a batched JSON answer"""
+    analyses = [None] * count
+    items = json.loads(content).get("products")
+    if not isinstance(items, list):
+        raise ValueError("Batched analysis has no products list")
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("id", position))
+            if 1 <= number <= count:
+                analyses[number - 1] = normalize_structured_analysis(item)
+        except (TypeError, ValueError):
+            continue
+    return analyses
+
+
+def _request_batch_analysis(products, mode):
+    """
+    One Groq request analysing every product in the list.
+    
+    Returns:
+        List with one analysis per product (markdown string, or normalized
+        dict in json mode); None where that product could not be parsed out
+    """
+    products_text = _products_prompt_text(products)
+    if mode == "json":
+        prompt = f"""Analyze the ingredients of each of these {len(products)} products:
+
+{products_text}
+
+Respond with a single JSON object of the form {{"products": [...]}} containing one entry per product, in the same order. Each entry has "id" (the product number) plus the fields of this schema:
+{STRUCTURED_SCHEMA}
+
+List every potentially harmful, controversial or banned ingredient in "risks" with its severity; use an empty list if there are none. Keep each text field to one short sentence."""
+        system_prompt = ANALYSIS_SYSTEM_PROMPT + " Always answer with valid JSON only."
+        max_tokens = STRUCTURED_MAX_TOKENS * len(products)
+        extra = {"response_format": {"type": "json_object"}}
+    else:
+        prompt = f"""Analyze each of the following {len(products)} products and their ingredients in detail:
+
+{products_text}
+
+For EACH product, start with a line containing only "===== PRODUCT <number> =====" and then provide a comprehensive analysis with the following structure:
+
+{ANALYSIS_SECTIONS}"""
+        system_prompt = ANALYSIS_SYSTEM_PROMPT
+        max_tokens = BATCH_MARKDOWN_MAX_TOKENS * len(products)
+        extra = {}
+    
+    response = scheduler.create(
+        model=ANALYSIS_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.2,
+        max_tokens=max_tokens,
+        **extra
+    )
+    
+    content = response.choices[0].message.content or ""
+    if mode == "json":
+        return _split_json_batch(content, len(products))
+    truncated = getattr(response.choices[0], "finish_reason", None) == "length"
+    return _split_markdown_batch(content, len(products), truncated)
+
+
+def _triage_cache_key(product):
+    return make_cache_key(product['title'], product['ingredients'], TRIAGE_PROMPT_VERSION, TRIAGE_MODEL)
+
+
+def triage_products(products):
+    """
+    Screen products with the small TRIAGE_MODEL in a single request.
+    
+    Args:
+        products: List of dicts with "title", "ingredients" and "store"
+    
+    Returns:
+        List with one verdict per product, in input order: a dict with
+        "needs_review", "reason", "ingredients" and "allergens", or None when
+        the product could not be screened (treat as needing review)
+    """
+    verdicts = [None] * len(products)
+    pending = []
+    for idx, prod in enumerate(products):
+        cached = analysis_cache.get(_triage_cache_key(prod), count_stats=False)
+        if cached is not None:
+            verdicts[idx] = dict(cached, cached=True)
+        else:
+            pending.append(idx)
+    
+    if not pending or not os.getenv("GROQ_API_KEY"):
+        return verdicts
+    
+    prompt = f"""For each product below, decide whether its ingredients need a detailed safety review.
+
+{_products_prompt_text([products[idx] for idx in pending])}
+
+Set "needs_review" to false ONLY if every ingredient is clearly identified and widely regarded as safe (for example plain milk, water or rolled oats). Set it to true if any ingredient is an additive, preservative, colour, sweetener or E-number, is potentially harmful or controversial, or is vague (such as "flavours" or "spices"), or if the ingredients are missing or unclear.
+
+Respond with a single JSON object of the form {{"products": [{{"id": <product number>, "needs_review": bool, "reason": str, "ingredients": [str], "allergens": [str]}}]}} with one entry per product. Keep "reason" to one short sentence."""
+    
+    try:
+        response = scheduler.create(
+            model=TRIAGE_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": TRIAGE_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0,
+            max_tokens=TRIAGE_MAX_TOKENS * len(pending),
+            response_format={"type": "json_object"}
+        )
+        items = json.loads(response.choices[0].message.content).get("products")
+    except Exception as e:
+        print(f"Groq triage failed, sending products to full analysis: {e}")
+        return verdicts
+    
+    for position, item in enumerate(items if isinstance(items, list) else [], 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("id", position))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= len(pending):
+            continue
+        verdict = {
+            # Anything but an explicit false goes on to the full analysis
+            "needs_review": item.get("needs_review") is not False,
+            "reason": str(item.get("reason") or "").strip(),
+            "ingredients": [str(name).strip() for name in item.get("ingredients") or [] if str(name).strip()],
+            "allergens": [str(name).strip() for name in item.get("allergens") or [] if str(name).strip()]
+        }
+        prod = products[pending[number - 1]]
+        analysis_cache.set(_triage_cache_key(prod), verdict)
+        verdicts[pending[number - 1]] = verdict
+    
+    return verdicts
+
+
+def _triaged_result(product, triage, triage_seconds):
+    """Analysis result for a product the triage model cleared"""
+    saved = routing_stats.record_triage(triage_seconds)
+    data = normalize_structured_analysis({
+        "ingredients": [{"name": name, "purpose": ""} for name in triage["ingredients"]],
+        "risks": [],
+        "allergens": triage["allergens"],
+        "health_notes": [triage["reason"]] if triage["reason"] else []
+    })
+    track_groq_analysis(product['title'], product['store'], True, model=TRIAGE_MODEL,
+                        route="triage", latency_saved=saved)
+    return {
+        "success": True,
+        "analysis": render_structured_analysis(data),
+        "structured": data,
+        "model": TRIAGE_MODEL,
+        "cached": bool(triage.get("cached")),
+        "route": "triage",
+        "latency_saved": saved
+    }
+
+
+def classify_ingredients(names):
+    """
+    Ask ANALYSIS_MODEL about ingredients the knowledge base does not know, in
+    one request, and add the verdicts to the knowledge base.
+    
+    Args:
+        names: Normalized ingredient names
+    
+    Returns:
+        Dict of name to knowledge base entry, for the names that got a usable verdict
+    """
+    if not names or not os.getenv("GROQ_API_KEY"):
+        return {}
+    
+    listed = "\n".join(f"{idx}. {name}" for idx, name in enumerate(names, 1))
+    prompt = f"""Give a safety verdict for each of these product ingredients:
+
+{listed}
+
+Respond with a single JSON object of the form {{"ingredients": [{{"id": <number>, "is_ingredient": bool, "tier": "HIGH" | "MODERATE" | "LOW" | "SAFE", "purpose": str, "note": str, "e_number": str, "allergens": [str], "animal": "dairy" | "egg" | "honey" | "meat" | "fish" | "insect" | null}}]}} with one entry per name. Set "is_ingredient" to false for text that is not an ingredient name. Use "SAFE" only for ingredients with no known health concerns, and keep "note" to one short sentence explaining the tier."""
+    
+    try:
+        response = scheduler.create(
+            model=ANALYSIS_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": ANALYSIS_SYSTEM_PROMPT + " Always answer with valid JSON only."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0,
+            max_tokens=80 * len(names) + 50,
+            response_format={"type": "json_object"}
+        )
+        items = json.loads(response.choices[0].message.content).get("ingredients")
+    except Exception as e:
+        print(f"Groq ingredient verdicts failed: {e}")
+        return {}
+    
+    knowledge_base = get_knowledge_base()
+    learned = {}
+    for position, item in enumerate(items if isinstance(items, list) else [], 1):
+        if not isinstance(item, dict) or item.get("is_ingredient") is False:
+            continue
+        try:
+            number = int(item.get("id", position))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= len(names):
+            entry = knowledge_base.learn(names[number - 1], item)
+            if entry is not None:
+                learned[names[number - 1]] = entry
+    return learned
+
+
+def knowledge_base_results(products):
+    """
+    Score products from the ingredient knowledge base. Ingredients it does not
+    know are looked up with a single classify_ingredients request for all the
+    products, and remembered.
+    
+    Args:
+        products: List of dicts with "title", "ingredients" and "store"
+    
+    Returns:
+        List with one result per product, shaped like
+        analyze_ingredients_with_groq's with "route" "kb", or None where the
+        product needs a model analysis (no parsable list, too many unknown
+        ingredients, or no verdict for one of them)
+    """
+    start = time.perf_counter()
+    knowledge_base = get_knowledge_base()
+    resolved = [knowledge_base.resolve(prod['ingredients']) for prod in products]
+    
+    unknown = []
+    for resolution in resolved:
+        if resolution is not None and len(resolution[1]) <= KB_MAX_UNKNOWN:
+            unknown.extend(name for name in resolution[1] if name not in unknown)
+    learned = classify_ingredients(unknown)
+    per_product = (time.perf_counter() - start) / max(1, len(products))
+    
+    results = []
+    for prod, resolution in zip(products, resolved):
+        if resolution is None or not all(name in learned for name in resolution[1]):
+            results.append(None)
+            continue
+        entries, names, declared = resolution
+        data = build_structured_analysis(entries + [learned[name] for name in names], declared)
+        model = ANALYSIS_MODEL if names else KB_MODEL
+        saved = routing_stats.record_local(per_product)
+        track_kb_analysis(prod['title'], prod['store'], True, model=model, learned=len(names), latency_saved=saved)
+        results.append({
+            "success": True,
+            "analysis": render_structured_analysis(data),
+            "structured": data,
+            "model": model,
+            "cached": False,
+            "route": "kb",
+            "latency_saved": saved
+        })
+    return results
+
+
+def analyze_products_batch(products, mode=None, routing=None):
+    """
+    Analyze several products with a single Groq request.
+    The shared instructions are sent once instead of once per product. Any
+    product whose analysis cannot be parsed out of the answer (or the whole
+    batch, if the request fails) falls back to a single-product request.
+    Products the ingredient knowledge base can score are settled first; with
+    tiered routing the rest are triaged in one request.
+    
+    Args:
+        products: List of dicts with "title", "ingredients" and "store"
+        mode: "markdown" or "json" (defaults to ANALYSIS_MODE)
+        routing: "tiered" or "direct" (defaults to ANALYSIS_ROUTING)
+    
+    Returns:
+        List of dicts shaped like analyze_ingredients_with_groq's, in input order
+    """
+    mode = mode or ANALYSIS_MODE
+    results = [None] * len(products)
+    
+    pending = []
+    for idx, prod in enumerate(products):
+        if analysis_cache.get(_analysis_cache_key(prod['title'], prod['ingredients'], mode), count_stats=False) is None:
+            pending.append(idx)
+    
+    if pending and INGREDIENT_KB == "on":
+        kb_results = knowledge_base_results([products[idx] for idx in pending])
+        for idx, kb_result in zip(pending, kb_results):
+            results[idx] = kb_result
+        pending = [idx for idx in pending if results[idx] is None]
+    
+    # Seconds of triage per product, charged to the ones that still need a deep analysis
+    triage_seconds = 0.0
+    if pending and (routing or ANALYSIS_ROUTING) == "tiered":
+        start = time.perf_counter()
+        verdicts = triage_products([products[idx] for idx in pending])
+        triage_seconds = (time.perf_counter() - start) / len(pending)
+        flagged = []
+        for idx, triage in zip(pending, verdicts):
+            if triage is not None and not triage["needs_review"]:
+                results[idx] = _triaged_result(products[idx], triage, triage_seconds)
+            else:
+                flagged.append(idx)
+        pending = flagged
+    
+    if len(pending) > 1 and os.getenv("GROQ_API_KEY"):
+        start = time.perf_counter()
+        try:
+            analyses = _request_batch_analysis([products[idx] for idx in pending], mode)
+        except Exception as e:
+            print(f"Batched Groq analysis failed, falling back to single requests: {e}")
+            analyses = [None] * len(pending)
+        per_product = (time.perf_counter() - start) / len(pending)
+        
+        for idx, analysis in zip(pending, analyses):
+            if not analysis:
+                continue
+            prod = products[idx]
+            analysis_cache.set(_analysis_cache_key(prod['title'], prod['ingredients'], mode), analysis)
+            track_groq_analysis(prod['title'], prod['store'], True, route="deep")
+            routing_stats.record_deep(per_product, triage_seconds)
+            result = {
+                "success": True,
+                "analysis": render_structured_analysis(analysis) if mode == "json" else analysis,
+                "model": ANALYSIS_MODEL,
+                "cached": False,
+                "batched": True,
+                "route": "deep"
+            }
+            if mode == "json":
+                result["structured"] = analysis
+            results[idx] = result
+    
+    # Cached products, single flagged products and anything the batch missed
+    for idx, prod in enumerate(products):
+        if results[idx] is None:
+            results[idx] = _deep_analysis(prod['title'], prod['ingredients'], prod['store'], mode,
+                                          triage_seconds if idx in pending else 0.0)
+    
+    return results
+
+
 def compare_products_with_groq(products_data):
     """
     Compare multiple products using Groq with focus on harmful ingredients
@@ -162,7 +866,7 @@ Provide a comprehensive comparison including:
 
 Be objective, evidence-based, and prioritize consumer safety."""
 
-        response = groq_client.chat.completions.create(
+        response = scheduler.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {
@@ -233,7 +937,7 @@ User question: {question}
 
 Please answer based on the product information above. If the information is insufficient, say so clearly."""
 
-        response = groq_client.chat.completions.create(
+        response = scheduler.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {
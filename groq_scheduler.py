@@ -0,0 +1,170 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future
+from groq import APIConnectionError, APIStatusError
+from tracing import span
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most `capacity`"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` units are available; returns seconds waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, delta):
+        """Give back (positive) or charge extra (negative) units"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+def _is_retryable(error):
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, if it said so"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class GroqScheduler:
+    """
+    Shared gate in front of Groq chat completions.
+
+    - Requests/min and tokens/min token buckets keep us under the account limits
+    - At most `max_concurrency` requests are in flight at once
+    - 429s, 5xx and connection errors are retried with jittered exponential backoff
+    - Identical concurrent requests are coalesced into a single API call
+    """
+
+    def __init__(self, client_factory, requests_per_minute=30, tokens_per_minute=12000,
+                 max_concurrency=4, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self._client_factory = client_factory
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.throttled_seconds = 0.0
+
+    @staticmethod
+    def _request_key(kwargs):
+        raw = json.dumps(kwargs, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _estimate_tokens(kwargs):
+        # ~4 characters per token for the prompt, plus the full output budget
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+        return prompt_chars // 4 + kwargs.get("max_tokens", 1024)
+
+    def create(self, **kwargs):
+        """Drop-in replacement for client.chat.completions.create(**kwargs)"""
+        key = self._request_key(kwargs)
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            with span(f"groq:{kwargs.get('model', '')}") as record:
+                response = self._call_with_retry(kwargs, record)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _call_with_retry(self, kwargs, record):
+        """Make the request, filling `record` (the tracing span) with retries, waiting and token usage"""
+        estimated = self._estimate_tokens(kwargs)
+        attempt = 0
+        record["throttled_ms"] = 0.0
+        while True:
+            waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(estimated)
+            self.throttled_seconds += waited
+            record["throttled_ms"] += waited * 1000
+            try:
+                with self._slots:
+                    self.calls += 1
+                    response = self._client_factory().chat.completions.create(**kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    # Full jitter keeps concurrent sessions from retrying in lockstep
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                record["retries"] = attempt
+                time.sleep(delay)
+                continue
+
+            # Refund the part of the reservation the request did not use
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.token_bucket.adjust(estimated - usage.total_tokens)
+                record["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+                record["completion_tokens"] = getattr(usage, "completion_tokens", None)
+                record["total_tokens"] = usage.total_tokens
+            return response
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "throttled_seconds": round(self.throttled_seconds, 2)
+        }
@@ -1,5 +1,10 @@
 import re
 
+# Keywords that start the harmful section, and keywords that keep a heading inside it
+_SECTION_START_RE = re.compile(r'harmful|concerning ingredients|risk')
+_SECTION_KEEP_RE = re.compile(r'harmful|concerning|risk')
+
+
 def extract_harmful_ingredients(groq_analysis):
     """
     Extract harmful ingredients from Groq analysis for quick display
@@ -18,32 +23,32 @@ def extract_harmful_ingredients(groq_analysis):
             "risk_level": "UNKNOWN"
         }
     
-    # Look for harmful ingredients section
+    # Lowercase and split once; lowercasing never adds or removes newlines,
+    # so both line lists line up
     harmful_section = ""
     analysis_lower = groq_analysis.lower()
+    section_lines = []
+    section_lower = []
     
     # Find harmful/concerning section
     if "harmful" in analysis_lower or "concerning" in analysis_lower:
-        # Try to extract the harmful section
-        lines = groq_analysis.split('\n')
-        in_harmful_section = False
-        harmful_lines = []
-        
-        for line in lines:
-            line_lower = line.lower()
-            
-            # Start of harmful section
-            if any(keyword in line_lower for keyword in ['harmful', 'concerning ingredients', 'risk']):
-                in_harmful_section = True
-                harmful_lines.append(line)
-            elif in_harmful_section:
-                # Check if we've moved to next section
-                if line.strip().startswith('##') or line.strip().startswith('**') and ':' in line:
-                    if not any(keyword in line_lower for keyword in ['harmful', 'concerning', 'risk']):
+        # The section starts on the first line with a start keyword
+        start = _SECTION_START_RE.search(analysis_lower)
+        if start:
+            lines = groq_analysis.split('\n')
+            lower_lines = analysis_lower.split('\n')
+            first = analysis_lower.count('\n', 0, start.start())
+            section_lines.append(lines[first])
+            section_lower.append(lower_lines[first])
+            for line, line_lower in zip(lines[first + 1:], lower_lines[first + 1:]):
+                # Check if we've moved to next section (start keywords are keep keywords too)
+                stripped = line.strip()
+                if stripped.startswith('##') or stripped.startswith('**') and ':' in line:
+                    if not _SECTION_KEEP_RE.search(line_lower):
                         break
-                harmful_lines.append(line)
-        
-        harmful_section = '\n'.join(harmful_lines)
+                section_lines.append(line)
+                section_lower.append(line_lower)
+            harmful_section = '\n'.join(section_lines)
     
     # Determine if there are harmful ingredients
     has_harmful = False
@@ -57,15 +62,14 @@ def extract_harmful_ingredients(groq_analysis):
         has_harmful = True
         risk_level = "HIGH"
         # Extract ingredients marked as high risk
-        for line in harmful_section.split('\n'):
-            if "high risk" in line.lower() or "⚠️" in line:
-                harmful_list.append(line.strip())
+        harmful_list = [
+            line.strip() for line, line_lower in zip(section_lines, section_lower)
+            if "high risk" in line_lower or "⚠️" in line
+        ]
     elif "moderate risk" in analysis_lower or "⚠️" in groq_analysis:
         has_harmful = True
         risk_level = "MODERATE"
-        for line in harmful_section.split('\n'):
-            if "moderate risk" in line.lower() or "risk" in line.lower():
-                harmful_list.append(line.strip())
+        harmful_list = [line.strip() for line, line_lower in zip(section_lines, section_lower) if "risk" in line_lower]
     elif any(keyword in analysis_lower for keyword in ['avoid', 'warning', 'concerning', 'harmful', 'toxic', 'dangerous']):
         has_harmful = True
         risk_level = "MODERATE"
@@ -77,6 +81,148 @@ def extract_harmful_ingredients(groq_analysis):
         "harmful_section": harmful_section[:500] if harmful_section else ""
     }
 
+RISK_FIELDS = ("risk_level", "has_harmful", "harmful_list")
+
+SEVERITIES = ("HIGH", "MODERATE", "LOW")
+
+HARMFUL_SEVERITIES = ("HIGH", "MODERATE")
+
+# Stored with the risk fields; bump it when the rules that compute them change
+# so backfill_risk_fields recomputes products saved under the old rules
+RISK_FIELDS_VERSION = 2
+
+
+def normalize_structured_analysis(data):
+    """
+    Coerce a JSON analysis from the model into the expected shape:
+    
+        {"ingredients": [{"name", "purpose"}],
+         "risks": [{"ingredient", "severity": HIGH|MODERATE|LOW, "reason"}],
+         "allergens": [str], "additives": [{"name", "e_number", "note"}],
+         "dietary": {"vegan", "vegetarian", "gluten_free": bool|None, "notes"},
+         "health_notes": [str]}
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Structured analysis must be a JSON object")
+    
+    def items(key):
+        value = data.get(key) or []
+        return value if isinstance(value, list) else [value]
+    
+    def text(value):
+        return str(value).strip() if value is not None else ""
+    
+    def entry(item, name_key):
+        return item if isinstance(item, dict) else {name_key: item}
+    
+    risks = []
+    for item in items("risks"):
+        item = entry(item, "ingredient")
+        severity = text(item.get("severity")).upper().replace(" RISK", "")
+        risks.append({
+            "ingredient": text(item.get("ingredient")),
+            "severity": severity if severity in SEVERITIES else "MODERATE",
+            "reason": text(item.get("reason"))
+        })
+    
+    dietary = data.get("dietary") if isinstance(data.get("dietary"), dict) else {}
+    return {
+        "ingredients": [
+            {"name": text(item.get("name")), "purpose": text(item.get("purpose"))}
+            for item in (entry(i, "name") for i in items("ingredients"))
+        ],
+        "risks": risks,
+        "allergens": [text(item) for item in items("allergens") if text(item)],
+        "additives": [
+            {"name": text(item.get("name")), "e_number": text(item.get("e_number")), "note": text(item.get("note"))}
+            for item in (entry(i, "name") for i in items("additives"))
+        ],
+        "dietary": {
+            "vegan": dietary.get("vegan") if isinstance(dietary.get("vegan"), bool) else None,
+            "vegetarian": dietary.get("vegetarian") if isinstance(dietary.get("vegetarian"), bool) else None,
+            "gluten_free": dietary.get("gluten_free") if isinstance(dietary.get("gluten_free"), bool) else None,
+            "notes": text(dietary.get("notes"))
+        },
+        "health_notes": [text(item) for item in items("health_notes") if text(item)]
+    }
+
+
+def structured_risk_fields(data):
+    """Exact risk fields from a structured analysis - no keyword heuristics"""
+    risks = data.get("risks", [])
+    if not risks:
+        return {"risk_level": "SAFE", "has_harmful": False, "harmful_list": []}
+    severities = {risk["severity"] for risk in risks}
+    risk_level = next(level for level in SEVERITIES if level in severities)
+    # Like the markdown heuristic, only MODERATE and HIGH risks count as harmful
+    harmful_list = [
+        f"{risk['ingredient']} - {risk['severity']} RISK" + (f": {risk['reason']}" if risk['reason'] else "")
+        for risk in sorted(risks, key=lambda r: SEVERITIES.index(r["severity"]))
+        if risk["severity"] in HARMFUL_SEVERITIES
+    ]
+    return {"risk_level": risk_level, "has_harmful": bool(harmful_list), "harmful_list": harmful_list[:5]}
+
+
+def render_structured_analysis(data):
+    """Render a structured analysis in the same six-section markdown as the essay mode"""
+    def yes_no(value):
+        return "Unknown" if value is None else ("Yes" if value else "No")
+    
+    lines = ["1. **INGREDIENTS BREAKDOWN:**"]
+    for item in data["ingredients"] or [{"name": "Not identified", "purpose": ""}]:
+        lines.append(f"   - **{item['name']}**" + (f": {item['purpose']}" if item['purpose'] else ""))
+    
+    lines += ["", "2. **HARMFUL/CONCERNING INGREDIENTS:**"]
+    if data["risks"]:
+        for risk in data["risks"]:
+            lines.append(f"   - ⚠️ **{risk['ingredient']}** - {risk['severity']} RISK" + (f": {risk['reason']}" if risk['reason'] else ""))
+    else:
+        lines.append("   - ✅ No harmful ingredients detected")
+    
+    lines += ["", "3. **ALLERGENS:**"]
+    lines += [f"   - {allergen}" for allergen in data["allergens"]] or ["   - None identified"]
+    
+    lines += ["", "4. **ADDITIVES & PRESERVATIVES:**"]
+    for additive in data["additives"]:
+        label = additive['name'] + (f" ({additive['e_number']})" if additive['e_number'] else "")
+        lines.append(f"   - {label}" + (f": {additive['note']}" if additive['note'] else ""))
+    if not data["additives"]:
+        lines.append("   - None identified")
+    
+    lines += ["", "5. **HEALTH CONSIDERATIONS:**"]
+    lines += [f"   - {note}" for note in data["health_notes"]] or ["   - No specific considerations"]
+    
+    dietary = data["dietary"]
+    lines += [
+        "",
+        "6. **DIETARY SUITABILITY:**",
+        f"   - Vegan: {yes_no(dietary['vegan'])}",
+        f"   - Vegetarian: {yes_no(dietary['vegetarian'])}",
+        f"   - Gluten-free: {yes_no(dietary['gluten_free'])}"
+    ]
+    if dietary["notes"]:
+        lines.append(f"   - {dietary['notes']}")
+    return "\n".join(lines)
+
+
+def risk_fields(groq_analysis, analysis_data=None):
+    """
+    Structured risk summary stored with each product at save time,
+    so render paths never have to re-parse the analysis.
+    Structured (JSON mode) analyses are used directly when available.
+    """
+    if analysis_data:
+        return structured_risk_fields(analysis_data)
+    harmful_info = extract_harmful_ingredients(groq_analysis)
+    return {field: harmful_info[field] for field in RISK_FIELDS}
+
+
+def get_analysis_label(route):
+    """Heading for a product's analysis: knowledge base results were not written by a model"""
+    if route == "kb":
+        return "📚 Ingredient Database Analysis"
+    return "🤖 Full AI Analysis"
+
 
 def get_risk_emoji(risk_level):
     """Get emoji for risk level"""
@@ -0,0 +1,315 @@
+import re
+
+# Words that introduce an ingredients block (matched on lowercased text)
+_INGREDIENTS_RE = re.compile(r'\bingredients?\b[ \t]*([:\-–]?)[ \t]*')
+_FALLBACK_KEYWORD_RE = re.compile(r'\b(contains|composition|made (?:with|from))\b[ \t]*[:\-–]?[ \t]*')
+
+# Phrases that end a list that has no full stop
+_STOP_RE = re.compile(r'\b(?:contains|may contain|allergens?|allergy advice|nutrition(?:al)? information|storage|store (?:in|below|at))\b')
+
+# One pass over the block: brackets, separators, the end of the list, and text in between
+_SCAN_RE = re.compile(
+    r'(?P<open>[(\[{])'
+    r'|(?P<close>[)\]}])'
+    r'|(?P<sep>[,;])'
+    r'|(?P<cut>\.\.\.|…)'
+    r'|(?P<end>\.(?!\d)|\n[ \t]*\n)'
+    r'|(?P<text>(?:[^()\[\]{},;.…\n]+|\.(?=\d)|\n(?![ \t]*\n))+)'
+)
+
+# A full stop ends the list only at the end of a line or before a capitalised
+# word, never after an abbreviation such as "min." or "approx."
+_AFTER_STOP_RE = re.compile(r'[ \t]*(?:\n|$)|\s+(\S)')
+_ABBREVIATIONS = frozenset(("min", "max", "approx", "incl", "ca", "vit", "eg", "e.g", "i.e"))
+
+_PERCENT_RE = re.compile(r'(?:\b(?:min(?:imum)?|max(?:imum)?|approx|ca)\.?\s*)?(\d+(?:\.\d+)?)\s*%')
+_E_NUMBER_RE = re.compile(r'^(?:e|ins)?\s*-?\s*(\d{3,4})\s*([a-j])?(?:\s*\(?[iv]+\)?)?$', re.I)
+_SPACES_RE = re.compile(r'\s+')
+
+# Allergen statements after the list: "contains milk", "may contain traces of
+# peanuts", "allergens: soy" (which may itself start with "contains")
+_STATEMENT_RE = re.compile(
+    r'\b(may contain|contains|allergens?|allergy (?:advice|information))\b[ \t]*[:\-–]?[ \t]*'
+    r'((?:(?!\bmay contain\b)[^.\n])*)'
+)
+_STATEMENT_PREFIX_RE = re.compile(r'^(?:(may contain|contains)\b[ \t]*[:\-–]?[ \t]*)?(?:traces? of\b[ \t]*)?')
+_STATEMENT_SPLIT_RE = re.compile(r'\s*(?:,|;|&|/|\band\b|\bor\b)\s*')
+
+# Characters after the list searched for allergen statements
+STATEMENT_WINDOW_CHARS = 300
+
+# Bracketed notes that are not sub-ingredients, e.g. "wheat flour (contains gluten)"
+_NOTE_PREFIXES = ("contains", "may contain")
+
+# Longest ingredients block scanned; a longer one is treated as cut off
+MAX_BLOCK_CHARS = 2000
+
+
+def normalize_name(name):
+    """Lowercased, single-spaced name with edge punctuation removed, used as the lookup key"""
+    return _SPACES_RE.sub(" ", str(name).lower().replace("’", "'")).strip(" .,;:*-_[](){}")
+
+
+def _code(name):
+    """e_number_key for an already normalized name"""
+    if not name or name[0] not in "ei0123456789":
+        return None
+    match = _E_NUMBER_RE.match(name)
+    if not match:
+        return None
+    number = int(match.group(1))
+    if not 100 <= number <= 1599:
+        return None
+    return f"e{number}{(match.group(2) or '').lower()}"
+
+
+def e_number_key(text):
+    """
+    The canonical E-number for a code such as "211", "E-211", "INS 211" or
+    "150d" (lowercase, e.g. "e150d"), or None if the text is not one
+    """
+    return _code(normalize_name(text))
+
+
+def _make_item(raw):
+    """Ingredient dict from the raw text of one list entry, or None if it is empty"""
+    percent = None
+    if "%" in raw:
+        match = _PERCENT_RE.search(raw)
+        if match:
+            percent = float(match.group(1))
+            raw = raw[:match.start()] + " " + raw[match.end():]
+    name = normalize_name(raw)
+    code = _code(name)
+    if code:
+        name = code = "E" + code[1:]
+    if not name and percent is None:
+        return None
+    return {"name": name, "percent": percent, "e_number": code, "details": []}
+
+
+def _add_details(item, details):
+    """Attach bracketed entries; a lone percentage or E-number describes the item itself"""
+    for detail in details:
+        if not detail["name"] and detail["percent"] is not None:
+            item["percent"] = detail["percent"]
+        elif detail["name"] and not detail["name"].startswith(_NOTE_PREFIXES):
+            item["details"].append(detail)
+    if len(item["details"]) == 1 and item["details"][0]["e_number"] and item["name"] and not item["e_number"]:
+        # "sodium benzoate (211)": the code identifies the item
+        item["e_number"] = item["details"].pop()["e_number"]
+
+
+def _allergen_statements(content, start, stop):
+    """
+    Declared allergens in content[start:stop] as (contains, may_contain),
+    two lists of names in the order they appear
+    """
+    statements = {"contains": [], "may contain": []}
+    previous = start
+    for match in _STATEMENT_RE.finditer(content, start, stop):
+        before = content[previous:match.start()].rstrip(" \t,")
+        if before and before[-1] not in ".;:!\n":
+            # Prose such as "this pack contains 6 bars", not a statement
+            continue
+        previous = match.end()
+        prefix = _STATEMENT_PREFIX_RE.match(match.group(2))
+        text = match.group(2)[prefix.end():]
+        if text.startswith("no "):
+            # "contains no artificial colours"
+            continue
+        kind = prefix.group(1) or match.group(1)
+        names = statements["may contain" if kind == "may contain" else "contains"]
+        for name in _STATEMENT_SPLIT_RE.split(text):
+            name = normalize_name(name)
+            if name and name not in names:
+                names.append(name)
+    return statements["contains"], statements["may contain"]
+
+
+def _ends_list(original, item_text, position):
+    """Whether the full stop just before position ends the ingredients list"""
+    words = item_text.split()
+    if words and words[-1] in _ABBREVIATIONS:
+        return False
+    if original is None:
+        return True
+    match = _AFTER_STOP_RE.match(original, position)
+    if match is None:
+        # "e.g.x"
+        return False
+    following = match.group(1)
+    return following is None or not following.isalpha() or following.isupper()
+
+
+def extract_ingredients(content):
+    """
+    Find the ingredients block in product text and split it into ingredients,
+    in a single pass over the text.
+
+    Args:
+        content: Product text (e.g. a search result snippet or page text)
+
+    Returns:
+        Dict with "keyword" (the word that introduced the block, e.g.
+        "ingredients"), "items" (list of {"name", "percent", "e_number",
+        "details"}, where details holds the bracketed sub-ingredients in the
+        same shape), "text" (the items as one normalized, comma-separated
+        string), "complete" (False if the list looks cut off), and "contains"
+        and "may_contain" (allergens declared after the list, e.g. "Contains:
+        milk" or "May contain traces of peanuts"), or None if the text has no
+        ingredients block
+    """
+    if not content:
+        return None
+
+    # Names are normalized to lowercase anyway, so scan a lowercased copy, keeping
+    # the original to tell a capitalised word after a full stop (when lowercasing
+    # kept the offsets)
+    lowered = content.lower()
+    original = content if len(lowered) == len(content) else None
+    content = lowered
+    
+    # The first "ingredients:" wins, then the first "ingredients", then the other keywords
+    best = None
+    position = content.find("ingredient")
+    while position != -1:
+        match = _INGREDIENTS_RE.match(content, position)
+        if match and (best is None or match.group(1)):
+            best = match
+            if match.group(1):
+                break
+        position = content.find("ingredient", position + 10)
+    if best is None:
+        best = _FALLBACK_KEYWORD_RE.search(content)
+    if best is None:
+        return None
+
+    start = best.end()
+    stop = min(len(content), start + MAX_BLOCK_CHARS)
+    items = []
+    item_text = []
+    details = []
+    detail_text = []
+    depth = 0
+    complete = stop == len(content)
+    end = stop
+
+    def finish_detail():
+        detail = _make_item("".join(detail_text))
+        detail_text.clear()
+        if detail is not None:
+            details.append(detail)
+
+    def finish_item():
+        item = _make_item("".join(item_text))
+        item_text.clear()
+        if item is not None:
+            _add_details(item, details)
+            if item["name"] or item["details"]:
+                items.append(item)
+        elif details:
+            items.extend(detail for detail in details if detail["name"])
+        details.clear()
+
+    for match in _SCAN_RE.finditer(content, start, stop):
+        kind = match.lastgroup
+        if kind == "text":
+            if depth:
+                detail_text.append(match.group())
+                continue
+            stop_word = _STOP_RE.search(match.group())
+            if stop_word is None:
+                item_text.append(match.group())
+                continue
+            # "... salt Contains milk": the list ends at the phrase
+            item_text.append(match.group()[:stop_word.start()])
+            complete = True
+            end = match.start() + stop_word.start()
+            break
+        elif kind == "open":
+            if depth:
+                # Nested brackets are flattened into the outer item's details
+                finish_detail()
+            depth += 1
+        elif kind == "close":
+            if depth:
+                finish_detail()
+                depth -= 1
+        elif kind == "sep":
+            if depth:
+                finish_detail()
+            else:
+                finish_item()
+        elif kind == "cut":
+            complete = False
+            break
+        elif depth and match.group().strip():
+            # "(min. 30%)"
+            detail_text.append(match.group())
+        elif match.group() == "." and not _ends_list(original, "".join(item_text), match.end()):
+            # "milk min. 3.4% fat", "sugar. salt"
+            item_text.append(".")
+        else:
+            complete = True
+            end = match.end()
+            break
+    if depth:
+        finish_detail()
+    finish_item()
+
+    if not items:
+        return None
+    contains, may_contain = _allergen_statements(content, end, end + STATEMENT_WINDOW_CHARS) if complete else ([], [])
+    return {
+        "keyword": "ingredients" if best.re is _INGREDIENTS_RE else best.group(1),
+        "items": items,
+        "text": format_ingredients(items),
+        "complete": complete,
+        "contains": contains,
+        "may_contain": may_contain
+    }
+
+
+def _format_item(item):
+    text = item["name"]
+    extras = [_format_item(detail) for detail in item["details"]]
+    if item["e_number"] and item["e_number"] != item["name"]:
+        extras.insert(0, item["e_number"])
+    if item["percent"] is not None:
+        extras.append(f"{item['percent']:g}%")
+    if extras:
+        text = f"{text} ({', '.join(extras)})" if text else ", ".join(extras)
+    return text
+
+
+def format_ingredients(items):
+    """Items from extract_ingredients as one comma-separated string"""
+    return ", ".join(_format_item(item) for item in items)
+
+
+def format_ingredient_block(block):
+    """
+    The block from extract_ingredients as short labelled text for prompts and
+    embeddings, e.g. "Ingredients: water, sugar, sodium benzoate (E211).
+    May contain: peanuts." A list that was cut off ends in "…" so it reads
+    (and re-parses) as incomplete.
+    """
+    label = block["keyword"].capitalize()
+    text = f"{label}: {block['text']}{'.' if block['complete'] else '…'}"
+    if block["contains"]:
+        text += f" Contains: {', '.join(block['contains'])}."
+    if block["may_contain"]:
+        text += f" May contain: {', '.join(block['may_contain'])}."
+    return text
+
+
+def ingredient_names(block):
+    """Every ingredient name in the block, sub-ingredients included, in list order"""
+    names = []
+    for item in block["items"]:
+        for entry in [item] + item["details"]:
+            for name in (entry["name"], entry["e_number"]):
+                if name and name.lower() not in names:
+                    names.append(name.lower())
+    return names
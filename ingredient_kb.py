@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from lazy_resource import LazyResource
+from ingredient_analyzer import normalize_structured_analysis, SEVERITIES
+from ingredient_extractor import extract_ingredients, normalize_name, e_number_key
+
+load_dotenv()
+
+# Curated ingredients and additives shipped with the app
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingredient_kb.json")
+
+# Verdicts learned from Groq are stored next to the other caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+TIERS = SEVERITIES + ("SAFE",)
+
+# Origins that make a product unsuitable for vegetarians (any origin rules out vegan)
+NON_VEGETARIAN = frozenset({"meat", "fish", "insect"})
+
+# Origin of declared allergens ("Contains: milk"), for the dietary flags
+ALLERGEN_ANIMALS = {
+    "milk": "dairy", "dairy": "dairy", "lactose": "dairy",
+    "egg": "egg", "eggs": "egg",
+    "fish": "fish", "crustacea": "fish", "crustaceans": "fish", "shellfish": "fish",
+    "mollusc": "fish", "molluscs": "fish"
+}
+
+# Words dropped from the front of a name when the full name is not known
+_QUALIFIERS = ("organic", "australian", "imported", "fresh", "pure", "premium", "select")
+
+
+def _looks_like_ingredient(name):
+    """Whether an unknown name is worth asking about (and remembering)"""
+    return bool(name) and len(name) <= 60 and len(name.split()) <= 6 and any(c.isalpha() for c in name)
+
+
+class IngredientKnowledgeBase:
+    """
+    Ingredient facts indexed by name, alias and E-number.
+
+    The curated seed file is loaded on start; verdicts learned from Groq for
+    ingredients it does not know are kept in a SQLite table and loaded too.
+    Each entry is a dict with "name", "tier" (HIGH, MODERATE, LOW or SAFE),
+    "purpose", "note" and optionally "e_number", "aliases", "allergens",
+    "animal" (dairy, egg, honey, meat, fish or insect), "class" (a label
+    such as "emulsifier" whose bracketed details are the real ingredients)
+    and "covers_details" (bracketed details need no separate lookup).
+    """
+
+    def __init__(self, path=None, seed_path=None):
+        self.path = path or os.path.join(CACHE_DIR, "ingredient_kb.sqlite3")
+        self.seed_path = seed_path or SEED_PATH
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self._index = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+        try:
+            with open(self.seed_path, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self._add(entry)
+        except Exception as e:
+            print(f"Could not load ingredient knowledge base {self.seed_path}: {e}")
+        self.seeded = len({entry["name"] for entry in self._index.values()})
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS learned ("
+                "key TEXT PRIMARY KEY, entry TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+            for key, raw in self._conn.execute("SELECT key, entry FROM learned"):
+                # Curated entries win over learned ones
+                self._index.setdefault(key, json.loads(raw))
+                self.learned += 1
+        except Exception as e:
+            # Learned verdicts then only last for this process
+            print(f"Could not open ingredient knowledge base {self.path}: {e}")
+            self._conn = None
+
+    def _add(self, entry):
+        keys = [entry["name"]] + list(entry.get("aliases") or [])
+        for key in keys:
+            self._index.setdefault(normalize_name(key), entry)
+        if entry.get("e_number"):
+            self._index.setdefault(entry["e_number"].lower(), entry)
+
+    def lookup(self, name):
+        """The entry for an ingredient name, alias or E-number code, or None"""
+        key = normalize_name(name)
+        code = e_number_key(key)
+        if code:
+            return self._index.get(code)
+        entry = self._index.get(key)
+        if entry is None:
+            words = key.split(" ")
+            while len(words) > 1 and words[0] in _QUALIFIERS:
+                words = words[1:]
+            key = " ".join(words)
+            entry = self._index.get(key)
+            if entry is None and key.endswith("s"):
+                entry = self._index.get(key[:-1])
+        return entry
+
+    def _lookup_item(self, item):
+        if item["e_number"]:
+            entry = self._index.get(item["e_number"].lower())
+            if entry is not None or item["name"] == item["e_number"]:
+                return entry
+        return self.lookup(item["name"])
+
+    def resolve(self, text):
+        """
+        Look up every ingredient in a product's ingredients list.
+
+        Returns:
+            Tuple of (entries, unknown, declared): the entries found and the
+            names not in the knowledge base, both in list order and without
+            duplicates, and the allergen statements of the label as a dict
+            with "contains" and "may_contain" lists. None if the text has no complete ingredients list, or it contains
+            items that do not look like ingredient names.
+        """
+        block = extract_ingredients(text)
+        if block is None or block["keyword"] != "ingredients" or not block["complete"]:
+            return None
+
+        items = []
+        for item in block["items"]:
+            entry = self._lookup_item(item) if item["name"] else None
+            if item["details"] and entry is not None and entry.get("class"):
+                # "emulsifiers (soy lecithin, 476)": the details are the ingredients
+                items.extend(item["details"])
+            elif entry is not None and entry.get("covers_details"):
+                items.append(item)
+            else:
+                # A compound ingredient such as "chocolate (sugar, cocoa butter)"
+                items.extend(([item] if item["name"] else []) + item["details"])
+
+        entries, unknown, seen = [], [], set()
+        with self._lock:
+            for item in items:
+                entry = self._lookup_item(item)
+                if entry is None:
+                    self.misses += 1
+                    name = item["name"]
+                    if not _looks_like_ingredient(name):
+                        return None
+                    if name not in seen:
+                        unknown.append(name)
+                    seen.add(name)
+                else:
+                    self.hits += 1
+                    if entry["name"] not in seen:
+                        entries.append(entry)
+                    seen.add(entry["name"])
+        return entries, unknown, {"contains": block["contains"], "may_contain": block["may_contain"]}
+
+    def learn(self, name, verdict):
+        """
+        Remember a verdict for an ingredient the knowledge base did not know.
+
+        Args:
+            name: The ingredient name as it appeared in the list
+            verdict: Dict with "tier", "purpose", "note" and optionally
+                "e_number", "allergens" and "animal"
+
+        Returns:
+            The stored entry, or None if the verdict was unusable
+        """
+        tier = str(verdict.get("tier") or "").upper().replace(" RISK", "")
+        key = normalize_name(name)
+        if tier not in TIERS or not _looks_like_ingredient(key):
+            return None
+
+        entry = {
+            "name": key,
+            "tier": tier,
+            "purpose": str(verdict.get("purpose") or "").strip(),
+            "note": str(verdict.get("note") or "").strip(),
+            "source": "groq"
+        }
+        code = e_number_key(verdict.get("e_number") or "")
+        if code:
+            entry["e_number"] = "E" + code[1:]
+        allergens = [normalize_name(a) for a in verdict.get("allergens") or [] if normalize_name(a)]
+        if allergens:
+            entry["allergens"] = allergens
+        animal = normalize_name(verdict.get("animal") or "")
+        if animal in ("dairy", "egg", "honey", "meat", "fish", "insect"):
+            entry["animal"] = animal
+
+        with self._lock:
+            existing = self._index.get(key)
+            if existing is not None:
+                return existing
+            self._index[key] = entry
+            self.learned += 1
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO learned (key, entry, created) VALUES (?, ?, ?)",
+                        (key, json.dumps(entry, ensure_ascii=False), time.time())
+                    )
+                    self._conn.commit()
+                except Exception as e:
+                    print(f"Could not save learned ingredient {key}: {e}")
+        return entry
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "seeded": self.seeded,
+                "learned": self.learned,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None
+            }
+
+
+# Loaded on first use, once per process
+_knowledge_base = LazyResource(IngredientKnowledgeBase)
+
+
+def get_knowledge_base():
+    """Shared ingredient knowledge base"""
+    return _knowledge_base.get()
+
+
+def get_knowledge_base_stats():
+    """Lookup hit rate and the number of curated and learned ingredients"""
+    return get_knowledge_base().stats()
+
+
+def _display_name(entry):
+    name = entry["name"].title()
+    return f"{name} ({entry['e_number']})" if entry.get("e_number") else name
+
+
+def build_structured_analysis(entries, declared=None):
+    """
+    Score a product from its knowledge base entries, without a model.
+
+    Args:
+        entries: Entries for every ingredient of the product
+        declared: Optional allergen statements from the label, a dict with
+            "contains" and "may_contain" lists (see IngredientKnowledgeBase.resolve)
+
+    Returns:
+        Structured analysis (see ingredient_analyzer.normalize_structured_analysis)
+    """
+    order = {severity: i for i, severity in enumerate(SEVERITIES)}
+    risks = sorted(
+        (
+            {"ingredient": _display_name(entry), "severity": entry["tier"], "reason": entry.get("note", "")}
+            for entry in entries if entry["tier"] in order
+        ),
+        key=lambda risk: order[risk["severity"]]
+    )
+
+    declared = declared or {}
+    allergens = []
+    for entry in entries:
+        for allergen in entry.get("allergens") or []:
+            if allergen not in allergens:
+                allergens.append(allergen)
+    for allergen in declared.get("contains") or []:
+        if allergen not in allergens:
+            allergens.append(allergen)
+
+    animal = {entry["animal"] for entry in entries if entry.get("animal")}
+    animal_names = [entry["name"] for entry in entries if entry.get("animal")]
+    for allergen in declared.get("contains") or []:
+        if allergen in ALLERGEN_ANIMALS:
+            animal.add(ALLERGEN_ANIMALS[allergen])
+            if allergen not in animal_names:
+                animal_names.append(allergen)
+
+    health_notes = []
+    high = [risk["ingredient"] for risk in risks if risk["severity"] == "HIGH"]
+    if high:
+        health_notes.append(f"Contains high-risk ingredients: {', '.join(high)}")
+    if allergens:
+        health_notes.append(f"Not suitable for people allergic to {', '.join(allergens)}")
+    if declared.get("may_contain"):
+        health_notes.append(f"May contain traces of {', '.join(declared['may_contain'])}")
+    health_notes.append("Scored from the ingredient knowledge base")
+
+    return normalize_structured_analysis({
+        "ingredients": [{"name": entry["name"].title(), "purpose": entry.get("purpose", "")} for entry in entries],
+        "risks": risks,
+        "allergens": allergens,
+        "additives": [
+            {"name": entry["name"].title(), "e_number": entry["e_number"], "note": entry.get("note", "")}
+            for entry in entries if entry.get("e_number")
+        ],
+        "dietary": {
+            "vegan": not animal,
+            "vegetarian": animal.isdisjoint(NON_VEGETARIAN),
+            "gluten_free": "gluten" not in allergens,
+            "notes": f"Animal-derived: {', '.join(animal_names)}" if animal_names else ""
+        },
+        "health_notes": health_notes
+    })
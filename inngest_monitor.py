@@ -1,19 +1,194 @@
 import os
+import json
+import time
+import queue
+import atexit
+import random
+import threading
 from inngest import Inngest, Event
 from dotenv import load_dotenv
 from datetime import datetime
+from lazy_resource import LazyResource
 
 load_dotenv()
 
-# Initialize Inngest client for sending events
-inngest = Inngest(
+# Inngest client for sending events, built on first use
+_inngest = LazyResource(lambda: Inngest(
     app_id=os.getenv("INNGEST_APP_ID", "product-safety-analyzer"),
     event_key=os.getenv("INNGEST_EVENT_KEY")
-)
+))
 
 EVENT_KEY = os.getenv("INNGEST_EVENT_KEY")
 
 
+def get_inngest_client():
+    """Shared Inngest client"""
+    return _inngest.get()
+
+
+class EventDispatcher:
+    """
+    Sends events from a background thread so tracking never blocks a request.
+
+    Events are queued in memory and sent in batches once `batch_size` events
+    are waiting or `flush_interval` seconds have passed. When the queue is more
+    than half full only a `sample_rate` fraction of new events is kept, and
+    when it is full new events are dropped. Batches that fail to send are
+    appended to a local spool file and retried after the next successful send.
+    """
+
+    def __init__(self, send, max_queue=1000, batch_size=50, flush_interval=2.0,
+                 sample_rate=0.25, spool_path=None):
+        self._send = send
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.spool_path = spool_path
+        self.sent = 0
+        self.dropped = 0
+        self.spooled = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="inngest-dispatcher", daemon=True)
+                    self._thread.start()
+
+    def enqueue(self, event):
+        """Queue an event for sending; returns False if it was dropped"""
+        if self._queue.qsize() >= self.max_queue // 2 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self._ensure_worker()
+        return True
+
+    def _next_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch):
+        try:
+            self._send(batch)
+        except Exception as e:
+            print(f"⚠️ Inngest tracking error: {e}")
+            self._spool(batch)
+            return False
+        self.sent += len(batch)
+        print(f"✓ Inngest events sent: {len(batch)}")
+        self._replay_spool()
+        return True
+
+    def _spool(self, batch):
+        if not self.spool_path:
+            self.dropped += len(batch)
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                for event in batch:
+                    f.write(json.dumps({"name": event.name, "data": event.data}, default=str) + "\n")
+            self.spooled += len(batch)
+        except Exception as e:
+            print(f"⚠️ Could not spool Inngest events: {e}")
+            self.dropped += len(batch)
+
+    def _replay_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path, encoding='utf-8') as f:
+                events = [Event(**json.loads(line)) for line in f if line.strip()]
+            os.remove(self.spool_path)
+        except Exception as e:
+            print(f"⚠️ Could not read Inngest spool: {e}")
+            return
+        for start in range(0, len(events), self.batch_size):
+            chunk = events[start:start + self.batch_size]
+            try:
+                self._send(chunk)
+                self.sent += len(chunk)
+            except Exception as e:
+                print(f"⚠️ Inngest tracking error: {e}")
+                # Put back everything that was not delivered
+                self._spool(events[start:])
+                return
+
+    def flush(self, timeout=5.0):
+        """Send everything still queued, giving up after `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._deliver(batch)
+        # Out of time - keep the rest on disk for the next run
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._spool(leftover)
+
+    def close(self, timeout=5.0):
+        """Stop the worker and flush remaining events (called at exit)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "spooled": self.spooled
+        }
+
+
+dispatcher = EventDispatcher(
+    lambda events: get_inngest_client().send_sync(events),
+    max_queue=int(os.getenv("INNGEST_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("INNGEST_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("INNGEST_FLUSH_INTERVAL", "2.0")),
+    sample_rate=float(os.getenv("INNGEST_SAMPLE_RATE", "0.25")),
+    spool_path=os.getenv("INNGEST_SPOOL_PATH", os.path.join(os.getenv("CACHE_DIR", ".cache"), "inngest_spool.jsonl"))
+)
+atexit.register(dispatcher.close)
+
+
 def track_tavily_search(product_description, stores, result_count, success, error=None):
     """Track Tavily API search events"""
     if not EVENT_KEY:
@@ -32,13 +207,13 @@ def track_tavily_search(product_description, stores, result_count, success, erro
                 "api": "tavily"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: api/tavily.search")
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
 
 
-def track_groq_analysis(product_title, store, success, model="llama-3.3-70b-versatile", error=None):
+def track_groq_analysis(product_title, store, success, model="llama-3.3-70b-versatile", error=None,
+                        route=None, latency_saved=None):
     """Track Groq AI analysis events"""
     if not EVENT_KEY:
         return
@@ -51,13 +226,39 @@ def track_groq_analysis(product_title, store, success, model="llama-3.3-70b-vers
                 "product_title": product_title,
                 "store": store,
                 "model": model,
+                "route": route,
+                "latency_saved": latency_saved,
                 "success": success,
                 "error": str(error) if error else None,
                 "api": "groq"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: api/groq.analyze")
+        dispatcher.enqueue(event)
+    except Exception as e:
+        print(f"⚠️ Inngest tracking error: {e}")
+
+
+def track_kb_analysis(product_title, store, success, model="ingredient-kb", learned=0, latency_saved=None,
+                      error=None):
+    """Track products scored from the local ingredient knowledge base instead of a full Groq analysis"""
+    if not EVENT_KEY:
+        return
+    
+    try:
+        event = Event(
+            name="app/ingredient_kb.analyze",
+            data={
+                "timestamp": datetime.now().isoformat(),
+                "product_title": product_title,
+                "store": store,
+                "model": model,
+                "learned": learned,
+                "latency_saved": latency_saved,
+                "success": success,
+                "error": str(error) if error else None
+            }
+        )
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
 
@@ -79,8 +280,7 @@ def track_groq_comparison(product_count, success, model="llama-3.3-70b-versatile
                 "api": "groq"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: api/groq.compare")
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
 
@@ -103,8 +303,29 @@ def track_groq_qa(question, context_count, success, model="llama-3.3-70b-versati
                 "api": "groq"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: api/groq.qa")
+        dispatcher.enqueue(event)
+    except Exception as e:
+        print(f"⚠️ Inngest tracking error: {e}")
+
+
+def track_search_timing(product_description, duration_ms, stages, histograms, trace_name="search"):
+    """Track where the time of one search went (per-stage totals and latency histograms)"""
+    if not EVENT_KEY:
+        return
+    
+    try:
+        event = Event(
+            name="app/search.timing",
+            data={
+                "timestamp": datetime.now().isoformat(),
+                "product_description": product_description,
+                "trace": trace_name,
+                "duration_ms": round(duration_ms, 1),
+                "stages": stages,
+                "histograms": histograms
+            }
+        )
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
 
@@ -126,8 +347,7 @@ def track_qdrant_save(product_title, store, success, error=None):
                 "database": "qdrant"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: db/qdrant.save")
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
 
@@ -149,7 +369,6 @@ def track_qdrant_search(query, result_count, success, error=None):
                 "database": "qdrant"
             }
         )
-        inngest.send_sync(event)
-        print(f"✓ Inngest event sent: db/qdrant.search")
+        dispatcher.enqueue(event)
     except Exception as e:
         print(f"⚠️ Inngest tracking error: {e}")
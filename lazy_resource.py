@@ -0,0 +1,35 @@
+import threading
+
+
+class LazyResource:
+    """
+    Thread-safe, build-on-first-use singleton.
+
+    The factory runs at most once per process (unless reset() is called),
+    even when several Streamlit sessions ask for the resource at the same time.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the resource, building it on the first call"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._factory()
+                    self._loaded = True
+        return self._value
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    def reset(self):
+        """Drop the resource so the next get() builds a fresh one"""
+        with self._lock:
+            self._value = None
+            self._loaded = False
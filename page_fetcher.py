@@ -0,0 +1,171 @@
+import os
+import re
+import html
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from lazy_resource import LazyResource
+from result_cache import TwoTierCache
+
+load_dotenv()
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+# Stop reading a page after this many bytes
+MAX_PAGE_BYTES = int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(1024 * 1024)))
+FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "5"))
+CHUNK_SIZE = 16 * 1024
+
+# Product pages fetched at once across all searches. Every fetch runs on one
+# shared pool of this size, and the HTTP connection pool matches it.
+IMAGE_FETCH_WORKERS = max(1, int(os.getenv("IMAGE_FETCH_WORKERS", os.getenv("SEARCH_MAX_WORKERS", "8"))))
+
+# Responses that mean the page is gone for good, so "no image" can be cached
+GONE_STATUS_CODES = (404, 410)
+
+# Image URL per product page; pages without an image (or that no longer
+# exist) are cached as ""
+image_cache = TwoTierCache(
+    "product_images",
+    ttl=int(os.getenv("IMAGE_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "20000"))
+)
+
+# lxml is several times faster than the pure-Python parser when installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Image selectors for various stores, tried in order on the full page
+IMAGE_SELECTORS = [
+    # Coles
+    'img[class*="product"]',
+    'img[class*="Product"]',
+    # Woolworths
+    'img[class*="image"]',
+    'img[alt*="product"]',
+    # General
+    'meta[property="og:image"]',
+    'img[itemprop="image"]',
+    'img.product-image',
+    'img.main-image'
+]
+
+_HEAD_END_RE = re.compile(rb'</head\s*>', re.I)
+_HEAD_IMAGE_TAG_RE = re.compile(
+    rb'<meta\b[^>]*(?:property|itemprop)\s*=\s*["\'](?:og:image|image)["\'][^>]*>',
+    re.I
+)
+_CONTENT_ATTR_RE = re.compile(rb'\bcontent\s*=\s*["\']([^"\']+)["\']', re.I)
+
+
+def _create_session():
+    session = requests.Session()
+    # Keep connections to the few store domains open between products
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=IMAGE_FETCH_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+_session = LazyResource(_create_session)
+
+
+def get_session():
+    """Shared pooled HTTP session for product pages"""
+    return _session.get()
+
+
+_fetch_pool = LazyResource(lambda: ThreadPoolExecutor(max_workers=IMAGE_FETCH_WORKERS, thread_name_prefix="page-fetch"))
+
+
+def get_fetch_pool():
+    """Shared bounded executor that product page fetches run on"""
+    return _fetch_pool.get()
+
+
+def _absolute_url(img_url, page_url):
+    # Make absolute URL if relative
+    if img_url.startswith('//'):
+        return 'https:' + img_url
+    return urljoin(page_url, img_url)
+
+
+def _image_from_head(head, page_url):
+    """Find og:image (or itemprop image) in the raw <head> bytes"""
+    for tag in _HEAD_IMAGE_TAG_RE.finditer(head):
+        content = _CONTENT_ATTR_RE.search(tag.group(0))
+        if content:
+            img_url = html.unescape(content.group(1).decode('utf-8', 'replace')).strip()
+            if img_url:
+                return _absolute_url(img_url, page_url)
+    return None
+
+
+def _image_from_document(document, page_url):
+    """Run the store-specific selectors over the whole page"""
+    soup = BeautifulSoup(document, HTML_PARSER)
+    for selector in IMAGE_SELECTORS:
+        img = soup.select_one(selector)
+        if not img:
+            continue
+        img_url = img.get('content') if selector.startswith('meta') else img.get('src')
+        if img_url:
+            return _absolute_url(img_url, page_url)
+    return None
+
+
+def fetch_product_image(url):
+    """
+    Fetch a product page and return its main image URL (or None).
+    The page is streamed and reading stops as soon as the <head> yields an
+    image, so most pages are only partially downloaded.
+
+    Raises:
+        requests.RequestException on network errors and on error responses
+        other than 404/410, e.g. 403, 429 or 503 (these are not cached)
+    """
+    with get_session().get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+        if response.status_code in GONE_STATUS_CODES:
+            return None
+        if response.status_code != 200:
+            raise requests.HTTPError(f"{response.status_code} response for {url}", response=response)
+
+        buffer = b''
+        head_checked = False
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            buffer += chunk
+            if not head_checked:
+                head_end = _HEAD_END_RE.search(buffer)
+                if head_end:
+                    head_checked = True
+                    img_url = _image_from_head(buffer[:head_end.start()], url)
+                    if img_url:
+                        return img_url
+            if len(buffer) >= MAX_PAGE_BYTES:
+                break
+
+    return _image_from_document(buffer, url)
+
+
+def get_product_image(url):
+    """
+    Cached product image lookup. Found images, pages without one and pages
+    that no longer exist are cached, so re-searches never re-download a page
+    we already know about. Failed fetches raise and are retried next time.
+    """
+    cached = image_cache.get(url)
+    if cached is not None:
+        return cached or None
+
+    img_url = fetch_product_image(url)
+    image_cache.set(url, img_url or '')
+    return img_url
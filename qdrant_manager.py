@@ -1,38 +1,159 @@
 import os
+import json
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PayloadSchemaType,
+    Filter, FieldCondition, MatchAny, MatchValue,
+    SetPayload, SetPayloadOperation,
+    SparseVectorParams, SparseVector, Modifier, Prefetch, FusionQuery, Fusion
+)
+from dotenv import load_dotenv
+import re
+import zlib
 import uuid
+import hashlib
+import tempfile
+import threading
+from contextlib import nullcontext
+import numpy as np
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
 from datetime import datetime
 from inngest_monitor import track_qdrant_save, track_qdrant_search
+from lazy_resource import LazyResource
+from tracing import span
+from ingredient_analyzer import risk_fields, RISK_FIELDS, RISK_FIELDS_VERSION
+from ingredient_extractor import (
+    extract_ingredients, format_ingredient_block, ingredient_names, normalize_name, e_number_key
+)
+from ingredient_kb import get_knowledge_base
 
-# Initialize Qdrant client (using in-memory for simplicity, can switch to server)
-qdrant_client = QdrantClient(":memory:")  # Use ":memory:" for in-memory or provide URL for server
+load_dotenv()
+
+# Storage mode: QDRANT_URL for a Qdrant server, otherwise a local store at
+# QDRANT_PATH (on disk by default, ":memory:" for a throwaway in-memory store)
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PATH = os.getenv("QDRANT_PATH", ".qdrant")
 
-# Initialize sentence transformer for embeddings
-model = SentenceTransformer('all-MiniLM-L6-v2')
 
 COLLECTION_NAME = "product_ingredients"
 
-def initialize_qdrant():
-    """Initialize Qdrant collection for storing product ingredients"""
+# Embedding model used for products and queries
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Payload fields with keyword indexes, so filtered searches stay fast
+INDEXED_FIELDS = ["store", "risk_level", "product_description"]
+
+# Number of texts encoded per forward pass in save_products_to_qdrant
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+# Number of query embeddings memoized by embed_query
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "512"))
+
+# Named sparse vector with BM25-style weights of each product's ingredient terms,
+# next to the unnamed dense vector; Qdrant applies the IDF part at query time
+SPARSE_VECTOR_NAME = "ingredients"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Typical number of ingredient terms per product, for BM25 length normalization
+BM25_AVERAGE_TERMS = 25
+
+# "auto" answers ingredient lookups (e.g. "E621", "sodium benzoate",
+# "contains peanuts") from the sparse vector alone, without the embedding model, and
+# fuses sparse and dense results for everything else. "hybrid", "sparse" or
+# "dense" always use that mode.
+SEARCH_MODE = os.getenv("SEARCH_MODE", "auto")
+
+# Candidates each index contributes to a hybrid query, per requested result
+HYBRID_PREFETCH_FACTOR = 4
+
+# The local (on-disk or in-memory) client is not thread-safe, and search
+# results are saved from enrichment worker threads while the UI reads. Writes
+# always take the lock; with the local client reads take it too (a Qdrant
+# server handles concurrent reads). Reentrant, so a migration can export
+# and restore while holding it.
+_write_lock = threading.RLock()
+_read_lock = nullcontext() if QDRANT_URL else _write_lock
+
+# False while the collection predates the sparse vector (until
+# migrate_collection is run); searches and saves then use the dense vector only
+_has_sparse_vectors = True
+
+
+def create_qdrant_client():
+    """Create a Qdrant client for the configured storage mode"""
+    if QDRANT_URL:
+        return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    if QDRANT_PATH == ":memory:":
+        return QdrantClient(":memory:")
+    # Local on-disk storage survives restarts
+    return QdrantClient(path=QDRANT_PATH)
+
+
+def _connect():
+    client = create_qdrant_client()
+    _ensure_collection(client)
+    return client
+
+
+def _load_model():
+    # Imported here so torch is only loaded once embeddings are needed
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+# Built on first use, once per process
+_qdrant_client = LazyResource(_connect)
+_model = LazyResource(_load_model)
+
+
+def get_qdrant_client():
+    """Shared Qdrant client; the collection is created on first use"""
+    return _qdrant_client.get()
+
+
+def get_model():
+    """Shared sentence transformer for embeddings"""
+    return _model.get()
+
+
+def _create_collection(client):
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=VectorParams(
+            size=384,  # all-MiniLM-L6-v2 embedding size
+            distance=Distance.COSINE
+        ),
+        sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+    )
+
+
+def _ensure_collection(client):
+    """Create the collection if it does not exist yet"""
+    global _has_sparse_vectors
     try:
-        # Check if collection exists
-        collections = qdrant_client.get_collections().collections
-        collection_exists = any(col.name == COLLECTION_NAME for col in collections)
-        
-        if not collection_exists:
+        if not client.collection_exists(COLLECTION_NAME):
             # Create collection
-            qdrant_client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(
-                    size=384,  # all-MiniLM-L6-v2 embedding size
-                    distance=Distance.COSINE
-                )
-            )
+            _create_collection(client)
             print(f"Created Qdrant collection: {COLLECTION_NAME}")
+            _has_sparse_vectors = True
         else:
-            print(f"Collection {COLLECTION_NAME} already exists")
+            info = client.get_collection(collection_name=COLLECTION_NAME)
+            print(f"Collection {COLLECTION_NAME} already exists ({info.points_count} products)")
+            _has_sparse_vectors = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+            if not _has_sparse_vectors:
+                print("Collection has no ingredient index; searches use embeddings only until migrate_collection() is run")
+        
+        # Creating an index that already exists is a no-op. Local Qdrant
+        # has no payload indexes (filters are evaluated in memory).
+        if QDRANT_URL:
+            for field_name in INDEXED_FIELDS:
+                client.create_payload_index(
+                    collection_name=COLLECTION_NAME,
+                    field_name=field_name,
+                    field_schema=PayloadSchemaType.KEYWORD
+                )
         
         return True
     except Exception as e:
@@ -40,33 +161,242 @@ def initialize_qdrant():
         return False
 
 
+def initialize_qdrant():
+    """
+    Initialize Qdrant collection for storing product ingredients.
+    Safe to call repeatedly - an existing collection and its data are kept.
+    """
+    if not _qdrant_client.is_loaded:
+        # Connecting already ensures the collection
+        try:
+            get_qdrant_client()
+            return True
+        except Exception as e:
+            print(f"Error initializing Qdrant: {e}")
+            return False
+    client = get_qdrant_client()
+    with _write_lock:
+        return _ensure_collection(client)
+
+
 def extract_ingredients_from_content(content, title):
     """
     Extract ingredients information from product content.
-    This is a simple extraction - looks for ingredient-related text.
+    Returns the ingredients block, normalized (see
+    ingredient_extractor.format_ingredient_block), e.g.
+    "Ingredients: water, sugar, sodium benzoate (E211). May contain: milk."
+    Declared allergen statements are kept after the list. If the content has
+    no ingredients block, its first 300 characters are used as context.
     """
-    ingredients_text = ""
+    block = extract_ingredients(content)
+    if block is not None:
+        return format_ingredient_block(block)
     
-    # Common keywords that indicate ingredients section
-    keywords = ["ingredients", "contains", "composition", "made with", "made from"]
+    # If no ingredients found in content, use the full content as context
+    return content[:300]  # First 300 chars
+
+
+def canonical_product_url(url):
+    """Normalize a product URL (lowercase host, no query/fragment/trailing slash)"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower() or 'https', parts.netloc.lower(), path, '', ''))
+
+
+def product_point_id(product_data):
+    """Deterministic point id: the same product URL always maps to the same point"""
+    url = product_data.get('url', '')
+    if url and url != '#':
+        key = canonical_product_url(url)
+    else:
+        key = f"{product_data.get('store', '')}|{product_data.get('title', '')}".lower()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def compute_content_hash(product_data):
+    """Hash of the inputs to the Groq analysis and the embedding"""
+    raw = "\x1f".join([
+        " ".join(product_data.get('title', '').split()),
+        " ".join(product_data.get('content', '').split()),
+        " ".join(product_data.get('ingredients', '').split())
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_stored_products(products):
+    """
+    Look up already-saved versions of the given products by their point id.
     
-    content_lower = content.lower()
-    title_lower = title.lower()
+    Returns:
+        Dict mapping point id to the stored payload (missing products are absent)
+    """
+    ids = list({product_point_id(product_data) for product_data in products})
+    if not ids:
+        return {}
+    try:
+        with _read_lock, span("qdrant.lookup", items=len(ids)):
+            points = get_qdrant_client().retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=ids,
+                with_payload=True,
+                with_vectors=False
+            )
+        return {str(point.id): point.payload for point in points}
+    except Exception as e:
+        print(f"Error looking up stored products: {e}")
+        return {}
+
+
+def is_product_unchanged(product_data, stored_payload):
+    """True if the stored copy was built from the same content and has an analysis"""
+    return bool(
+        stored_payload
+        and stored_payload.get('content_hash') == compute_content_hash(product_data)
+        and stored_payload.get('groq_analysis')
+    )
+
+
+# Words that say nothing about an ingredient
+_TERM_STOPWORDS = frozenset({"and", "of", "or", "with", "from", "in", "the", "a", "added"})
+# Words in front of the ingredients in a query such as "contains e621"
+_QUERY_PREFIX_RE = re.compile(r'^(?:(?:products?|items?|foods?|things?)\s+)?(?:that\s+)?(?:contains?|containing|with|made with|including|has|have)\s+')
+_QUERY_SPLIT_RE = re.compile(r'\s*(?:,|;|\band\b|&|\+)\s*')
+
+
+def ingredient_terms(names, words=True):
+    """
+    Sparse index terms for a list of ingredient names: each name, its
+    knowledge base name and E-number (so "msg", "E621" and "monosodium
+    glutamate" match each other) and, with words=True, its individual words.
+    """
+    knowledge_base = get_knowledge_base()
+    terms = []
+    for name in names:
+        name = normalize_name(name)
+        if not name:
+            continue
+        code = e_number_key(name)
+        entry = knowledge_base.lookup(name)
+        terms.append(code or name)
+        if entry is not None:
+            if entry["name"] != name:
+                terms.append(entry["name"])
+            if entry.get("e_number") and entry["e_number"].lower() != code:
+                terms.append(entry["e_number"].lower())
+        if words and " " in name:
+            terms.extend(word for word in name.split(" ") if word not in _TERM_STOPWORDS)
+    return terms
+
+
+def _term_index(term):
+    # Stable across processes, unlike hash()
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def sparse_ingredient_vector(names):
+    """BM25-style document vector (term frequency with length normalization) for a product's ingredients"""
+    terms = ingredient_terms(names)
+    counts = {}
+    for term in terms:
+        index = _term_index(term)
+        counts[index] = counts.get(index, 0) + 1
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / BM25_AVERAGE_TERMS)
+    indices = sorted(counts)
+    return SparseVector(
+        indices=indices,
+        values=[counts[i] * (BM25_K1 + 1) / (counts[i] + norm) for i in indices]
+    )
+
+
+def _query_ingredient_names(query):
+    """The ingredient names asked for in a query such as "contains sodium benzoate and E621" """
+    query = normalize_name(query)
+    query = _QUERY_PREFIX_RE.sub("", query)
+    return [name for name in _QUERY_SPLIT_RE.split(query) if name]
+
+
+def sparse_query_vector(query, words=True):
+    """
+    Sparse vector for a query; every term weighs 1 and Qdrant adds its IDF.
+    With words=False only whole ingredient names and E-numbers match.
+    """
+    indices = sorted({_term_index(term) for term in ingredient_terms(_query_ingredient_names(query), words)})
+    return SparseVector(indices=indices, values=[1.0] * len(indices))
+
+
+def is_ingredient_query(query):
+    """
+    True if the query clearly asks which products contain an ingredient: it
+    starts with "contains", "with" etc., or every name in it is an E-number
+    or an additive in the knowledge base. Plain food names such as "cheese"
+    or "olive oil" are product searches, not ingredient lookups.
+    """
+    names = _query_ingredient_names(query)
+    if not names:
+        return False
+    if _QUERY_PREFIX_RE.match(normalize_name(query)):
+        return True
+    knowledge_base = get_knowledge_base()
+    return all(e_number_key(name) or (knowledge_base.lookup(name) or {}).get("e_number") for name in names)
+
+
+def _payload_ingredient_names(payload):
+    names = payload.get('ingredient_list')
+    if names is None:
+        # Saved before ingredient_list existed
+        block = extract_ingredients(payload.get('ingredients', ''))
+        names = ingredient_names(block) if block else []
+    return names
+
+
+def _make_point(point_id, embedding, payload):
+    """Point with the dense embedding and the sparse ingredient vector"""
+    if not _has_sparse_vectors:
+        return PointStruct(id=point_id, vector=embedding, payload=payload)
+    vector = {"": embedding}
+    sparse = sparse_ingredient_vector(_payload_ingredient_names(payload))
+    if sparse.indices:
+        vector[SPARSE_VECTOR_NAME] = sparse
+    return PointStruct(id=point_id, vector=vector, payload=payload)
+
+
+def _prepare_product(product_data):
+    """Return (point_id, ingredients, text_to_embed, payload) for a product dict"""
+    # Extract or get ingredients
+    ingredients = product_data.get('ingredients', '')
+    if not ingredients:
+        ingredients = extract_ingredients_from_content(
+            product_data.get('content', ''),
+            product_data.get('title', '')
+        )
     
-    # Check if content mentions ingredients
-    for keyword in keywords:
-        if keyword in content_lower:
-            # Try to extract the relevant part
-            start_idx = content_lower.find(keyword)
-            # Get text after the keyword (next 200 chars)
-            ingredients_text = content[start_idx:start_idx+300]
-            break
+    block = extract_ingredients(ingredients)
     
-    # If no ingredients found in content, use the full content as context
-    if not ingredients_text:
-        ingredients_text = content[:300]  # First 300 chars
+    # Embedding text for the product (title + ingredients)
+    text_to_embed = f"{product_data.get('title', '')} {ingredients}"
     
-    return ingredients_text
+    payload = {
+        "title": product_data.get('title', ''),
+        "url": product_data.get('url', ''),
+        "store": product_data.get('store', ''),
+        "ingredients": ingredients,
+        "ingredient_list": ingredient_names(block) if block else [],  # Normalized names and E-numbers
+        "content": product_data.get('content', '')[:500],  # Store first 500 chars
+        "timestamp": datetime.now().isoformat(),
+        "product_description": product_data.get('product_description', ''),
+        "groq_analysis": product_data.get('groq_analysis', ''),  # Store Groq analysis
+        "analysis_data": product_data.get('analysis_data'),  # Structured (JSON mode) analysis
+        "analysis_route": product_data.get('analysis_route'),  # "kb" when scored without a model
+        "image": product_data.get('image'),
+        "content_hash": compute_content_hash(product_data)
+    }
+    # Risk summary is computed once here, unless the caller already has it
+    if all(field in product_data for field in RISK_FIELDS):
+        payload.update({field: product_data[field] for field in RISK_FIELDS})
+    else:
+        payload.update(risk_fields(product_data.get('groq_analysis', ''), product_data.get('analysis_data')))
+    payload["risk_version"] = RISK_FIELDS_VERSION
+    return product_point_id(product_data), ingredients, text_to_embed, payload
 
 
 def save_product_to_qdrant(product_data):
@@ -77,39 +407,19 @@ def save_product_to_qdrant(product_data):
         product_data: Dict with keys - title, url, content, store, ingredients, groq_analysis
     """
     try:
-        # Extract or get ingredients
-        ingredients = product_data.get('ingredients', '')
-        if not ingredients:
-            ingredients = extract_ingredients_from_content(
-                product_data.get('content', ''),
-                product_data.get('title', '')
-            )
+        point_id, ingredients, text_to_embed, payload = _prepare_product(product_data)
+        with span("qdrant.encode", items=1):
+            embedding = get_model().encode(text_to_embed).tolist()
         
-        # Create embedding for the product (title + ingredients)
-        text_to_embed = f"{product_data.get('title', '')} {ingredients}"
-        embedding = model.encode(text_to_embed).tolist()
-        
-        # Create point
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embedding,
-            payload={
-                "title": product_data.get('title', ''),
-                "url": product_data.get('url', ''),
-                "store": product_data.get('store', ''),
-                "ingredients": ingredients,
-                "content": product_data.get('content', '')[:500],  # Store first 500 chars
-                "timestamp": datetime.now().isoformat(),
-                "product_description": product_data.get('product_description', ''),
-                "groq_analysis": product_data.get('groq_analysis', '')  # Store Groq analysis
-            }
-        )
+        # Create point (re-saving a product overwrites its previous version)
+        point = _make_point(point_id, embedding, payload)
         
         # Upsert to Qdrant
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[point]
-        )
+        with _write_lock, span("qdrant.upsert", items=1):
+            get_qdrant_client().upsert(
+                collection_name=COLLECTION_NAME,
+                points=[point]
+            )
         
         # Track with Inngest
         track_qdrant_save(product_data.get('title', ''), product_data.get('store', ''), True)
@@ -122,24 +432,205 @@ def save_product_to_qdrant(product_data):
         return False, str(e)
 
 
-def search_similar_products(query, limit=5):
+def save_products_to_qdrant(products, batch_size=None):
+    """
+    Save several products to Qdrant with one batched encode and one upsert
+    
+    Args:
+        products: List of product dicts (same keys as save_product_to_qdrant)
+        batch_size: Encoder batch size (defaults to EMBED_BATCH_SIZE)
+    
+    Returns:
+        List of (success, ingredients_or_error) tuples, in input order
+    """
+    if not products:
+        return []
+    
+    try:
+        prepared = [_prepare_product(product_data) for product_data in products]
+        
+        # Encode all products in one batched forward pass
+        with span("qdrant.encode", items=len(prepared)):
+            embeddings = get_model().encode(
+                [text for _, _, text, _ in prepared],
+                batch_size=batch_size or EMBED_BATCH_SIZE
+            )
+        
+        # Duplicate products within one batch collapse onto a single point
+        points = [
+            _make_point(point_id, embedding.tolist(), payload)
+            for (point_id, _, _, payload), embedding in zip(prepared, embeddings)
+        ]
+        
+        # Single upsert for the whole batch
+        with _write_lock, span("qdrant.upsert", items=len(points)):
+            get_qdrant_client().upsert(
+                collection_name=COLLECTION_NAME,
+                points=points
+            )
+        
+        # Track with Inngest
+        for product_data in products:
+            track_qdrant_save(product_data.get('title', ''), product_data.get('store', ''), True)
+        
+        return [(True, ingredients) for _, ingredients, _, _ in prepared]
+    except Exception as e:
+        print(f"Error saving to Qdrant: {e}")
+        # Track error with Inngest
+        for product_data in products:
+            track_qdrant_save(product_data.get('title', ''), product_data.get('store', ''), False, error=e)
+        return [(False, str(e)) for _ in products]
+
+
+class QueryEmbeddingCache:
+    """LRU of query embeddings, stored as compact float32 arrays"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def set(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries)
+            }
+
+
+_query_embeddings = QueryEmbeddingCache(QUERY_EMBED_CACHE_SIZE)
+
+
+def embed_query(query):
+    """
+    Embedding for a search query, memoized on the normalized query text so
+    Streamlit reruns with the same query skip the transformer entirely.
+    """
+    key = QueryEmbeddingCache.normalize(query)
+    vector = _query_embeddings.get(key)
+    if vector is None:
+        with span("qdrant.encode", items=1):
+            vector = np.asarray(get_model().encode(key), dtype=np.float32)
+        _query_embeddings.set(key, vector)
+    return vector
+
+
+def get_query_embedding_stats():
+    """Hit/miss counters for the query embedding memo"""
+    return _query_embeddings.stats()
+
+
+def build_product_filter(stores=None, risk_levels=None, exclude_risk_levels=None, product_description=None):
+    """
+    Build a Qdrant filter over the indexed payload fields (None if no filter).
+    
+    Args:
+        stores: Only products from these stores
+        risk_levels: Only products with one of these risk levels
+        exclude_risk_levels: Skip products with these risk levels, e.g. ["HIGH"]
+        product_description: Only products found by this search
+    """
+    must = []
+    must_not = []
+    if stores:
+        must.append(FieldCondition(key="store", match=MatchAny(any=list(stores))))
+    if risk_levels:
+        must.append(FieldCondition(key="risk_level", match=MatchAny(any=list(risk_levels))))
+    if exclude_risk_levels:
+        must_not.append(FieldCondition(key="risk_level", match=MatchAny(any=list(exclude_risk_levels))))
+    if product_description:
+        must.append(FieldCondition(key="product_description", match=MatchValue(value=product_description)))
+    if not must and not must_not:
+        return None
+    return Filter(must=must or None, must_not=must_not or None)
+
+
+def search_similar_products(query, limit=5, stores=None, risk_levels=None,
+                            exclude_risk_levels=None, product_description=None, mode=None):
     """
     Search for similar products in Qdrant based on query
     
     Args:
         query: Search query (product name or ingredients)
         limit: Number of results to return
+        stores, risk_levels, exclude_risk_levels, product_description:
+            Optional filters applied inside Qdrant (see build_product_filter),
+            e.g. stores=["Coles"], exclude_risk_levels=["HIGH"]
+        mode: "auto", "hybrid", "sparse" or "dense" (defaults to SEARCH_MODE)
     """
     try:
-        # Create embedding for query
-        query_embedding = model.encode(query).tolist()
+        client = get_qdrant_client()
+        # Collections that predate the ingredient index only have embeddings
+        mode = (mode or SEARCH_MODE) if _has_sparse_vectors else "dense"
+        query_filter = build_product_filter(stores, risk_levels, exclude_risk_levels, product_description)
+        sparse_query = sparse_query_vector(query) if mode != "dense" else None
+        
+        # Exact ingredient lookups skip the embedding model entirely; if
+        # nothing contains the ingredient, auto mode falls back to hybrid
+        if mode == "sparse" or mode == "auto" and sparse_query.indices and is_ingredient_query(query):
+            with _read_lock, span("qdrant.search", mode="sparse"):
+                results = client.query_points(
+                    collection_name=COLLECTION_NAME,
+                    query=sparse_query_vector(query, words=False),
+                    using=SPARSE_VECTOR_NAME,
+                    query_filter=query_filter,
+                    limit=limit
+                ).points
+            if results or mode == "sparse":
+                track_qdrant_search(query, len(results), True)
+                return results
+        
+        # Create (or reuse) embedding for query
+        query_embedding = embed_query(query).tolist()
         
         # Search in Qdrant
-        results = qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_embedding,
-            limit=limit
-        )
+        if mode == "dense" or not sparse_query.indices:
+            with _read_lock, span("qdrant.search", mode="dense"):
+                results = client.query_points(
+                    collection_name=COLLECTION_NAME,
+                    query=query_embedding,
+                    query_filter=query_filter,
+                    limit=limit
+                ).points
+        else:
+            # Reciprocal rank fusion of the dense and sparse candidates
+            candidates = limit * HYBRID_PREFETCH_FACTOR
+            with _read_lock, span("qdrant.search", mode="hybrid"):
+                results = client.query_points(
+                    collection_name=COLLECTION_NAME,
+                    prefetch=[
+                        Prefetch(query=query_embedding, filter=query_filter, limit=candidates),
+                        Prefetch(query=sparse_query, using=SPARSE_VECTOR_NAME, filter=query_filter, limit=candidates)
+                    ],
+                    query=FusionQuery(fusion=Fusion.RRF),
+                    limit=limit
+                ).points
         
         # Track with Inngest
         track_qdrant_search(query, len(results), True)
@@ -152,24 +643,72 @@ def search_similar_products(query, limit=5):
         return []
 
 
-def get_all_products():
-    """Get all stored products from Qdrant"""
+def get_products_page(offset=None, limit=20, fields=None):
+    """
+    Get one page of stored products using Qdrant scroll offsets
+    
+    Args:
+        offset: Cursor returned by the previous page (None for the first page)
+        limit: Number of products per page
+        fields: Payload fields to return (None returns the full payload)
+    
+    Returns:
+        Tuple of (points, next_offset); next_offset is None on the last page
+    """
     try:
-        # Scroll through all points
-        results = qdrant_client.scroll(
-            collection_name=COLLECTION_NAME,
-            limit=100
-        )
-        return results[0]  # Returns list of points
+        with _read_lock:
+            points, next_offset = get_qdrant_client().scroll(
+                collection_name=COLLECTION_NAME,
+                limit=limit,
+                offset=offset,
+                with_payload=fields if fields is not None else True,
+                with_vectors=False
+            )
+        return points, next_offset
     except Exception as e:
         print(f"Error getting products: {e}")
+        return [], None
+
+
+def iter_products(fields=None, page_size=100):
+    """Lazily iterate over every stored product, one page at a time"""
+    offset = None
+    while True:
+        points, offset = get_products_page(offset=offset, limit=page_size, fields=fields)
+        yield from points
+        if offset is None:
+            break
+
+
+def get_products_by_ids(ids, fields=None):
+    """Fetch specific products by point id, in the given order"""
+    if not ids:
         return []
+    try:
+        with _read_lock:
+            points = get_qdrant_client().retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=list(ids),
+                with_payload=fields if fields is not None else True,
+                with_vectors=False
+            )
+        by_id = {str(point.id): point for point in points}
+        return [by_id[str(point_id)] for point_id in ids if str(point_id) in by_id]
+    except Exception as e:
+        print(f"Error getting products: {e}")
+        return []
+
+
+def get_all_products():
+    """Get all stored products from Qdrant (prefer get_products_page for views)"""
+    return list(iter_products())
 
 
 def get_collection_stats():
     """Get statistics about the collection"""
     try:
-        info = qdrant_client.get_collection(collection_name=COLLECTION_NAME)
+        with _read_lock:
+            info = get_qdrant_client().get_collection(collection_name=COLLECTION_NAME)
         return {
             "total_products": info.points_count,
             "vector_size": info.config.params.vectors.size,
@@ -178,3 +717,178 @@ def get_collection_stats():
     except Exception as e:
         print(f"Error getting stats: {e}")
         return {}
+
+
+def backfill_risk_fields(force=False, batch_size=256):
+    """
+    Add the structured risk fields to products saved before they existed, and
+    recompute them for products saved under older rules (RISK_FIELDS_VERSION).
+    
+    Args:
+        force: Recompute the fields for every product (e.g. after the
+            risk extraction rules change)
+        batch_size: Products updated per request
+    
+    Returns:
+        Number of products updated
+    """
+    client = get_qdrant_client()
+    # Products saved before the risk fields existed have no risk_version either
+    scroll_filter = None if force else Filter(
+        must_not=[FieldCondition(key="risk_version", match=MatchValue(value=RISK_FIELDS_VERSION))]
+    )
+    
+    updated = 0
+    offset = None
+    while True:
+        with _read_lock:
+            points, offset = client.scroll(
+                collection_name=COLLECTION_NAME,
+                scroll_filter=scroll_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=['groq_analysis', 'analysis_data'],
+                with_vectors=False
+            )
+        if points:
+            operations = [
+                SetPayloadOperation(set_payload=SetPayload(
+                    payload=dict(
+                        risk_fields(point.payload.get('groq_analysis', ''), point.payload.get('analysis_data')),
+                        risk_version=RISK_FIELDS_VERSION
+                    ),
+                    points=[point.id]
+                ))
+                for point in points
+            ]
+            with _write_lock:
+                client.batch_update_points(collection_name=COLLECTION_NAME, update_operations=operations)
+            updated += len(points)
+        if offset is None:
+            break
+    
+    if updated:
+        print(f"Backfilled risk fields for {updated} products")
+    return updated
+
+
+def _export_points(client, path):
+    count = 0
+    offset = None
+    with open(path, 'w', encoding='utf-8') as f:
+        while True:
+            with _read_lock:
+                points, offset = client.scroll(
+                    collection_name=COLLECTION_NAME,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+            for point in points:
+                # Only the dense vector; sparse vectors are rebuilt from the payload
+                vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+                f.write(json.dumps({
+                    "id": str(point.id),
+                    "vector": vector,
+                    "payload": point.payload
+                }, ensure_ascii=False) + "\n")
+                count += 1
+            if offset is None:
+                break
+    return count
+
+
+def export_snapshot(path):
+    """
+    Write every point (id, vector, payload) of the collection to a JSONL file.
+    Works with all storage modes, including local ones without snapshot support.
+    
+    Returns:
+        Number of points written
+    """
+    return _export_points(get_qdrant_client(), path)
+
+
+def _restore_points(client, path, batch_size=256):
+    # Callers hold _write_lock
+    def flush(batch):
+        client.upsert(collection_name=COLLECTION_NAME, points=batch)
+    
+    count = 0
+    batch = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            point_id = int(record["id"]) if record["id"].isdigit() else record["id"]
+            batch.append(_make_point(point_id, record["vector"], record["payload"]))
+            if len(batch) >= batch_size:
+                flush(batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        flush(batch)
+        count += len(batch)
+    return count
+
+
+def restore_snapshot(path, batch_size=256):
+    """
+    Load points written by export_snapshot back into the collection.
+    Existing points with the same ids are overwritten. Sparse ingredient
+    vectors are computed from the restored payloads.
+    
+    Returns:
+        Number of points restored
+    """
+    initialize_qdrant()
+    with _write_lock:
+        return _restore_points(get_qdrant_client(), path, batch_size)
+
+
+def migrate_collection(allow_remote=False):
+    """
+    Rebuild a collection created before the sparse ingredient vector existed.
+    Sparse vectors cannot be added to an existing collection, so the points are
+    exported, the collection is recreated and the points are restored (which
+    computes their sparse vectors). Dense vectors are kept, nothing is re-encoded.
+    
+    Run it once, by hand, with no other app instance using the collection:
+    saves from this process wait for it, but writes from other processes
+    during the rebuild are lost.
+    
+    Args:
+        allow_remote: Also migrate a shared Qdrant server (QDRANT_URL)
+    
+    Returns:
+        Number of products migrated (0 if the collection is already up to
+        date), or None if it was not run
+    """
+    global _has_sparse_vectors
+    if QDRANT_URL and not allow_remote:
+        print("Not migrating a Qdrant server; stop the other app instances and pass allow_remote=True")
+        return None
+    
+    client = get_qdrant_client()
+    with _write_lock:
+        info = client.get_collection(collection_name=COLLECTION_NAME)
+        if SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {}):
+            _has_sparse_vectors = True
+            return 0
+        
+        fd, path = tempfile.mkstemp(prefix="qdrant_migration_", suffix=".jsonl")
+        os.close(fd)
+        count = _export_points(client, path)
+        client.delete_collection(collection_name=COLLECTION_NAME)
+        _create_collection(client)
+        _has_sparse_vectors = True
+        try:
+            _restore_points(client, path)
+        except Exception:
+            print(f"Migration failed; the exported products are in {path} (see restore_snapshot)")
+            raise
+        os.remove(path)
+    print(f"Added sparse ingredient vectors to {count} products")
+    return count
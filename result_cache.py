@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from lazy_resource import LazyResource
+
+load_dotenv()
+
+# Directory holding the on-disk cache databases
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+
+def make_cache_key(*parts):
+    """
+    Build a content-addressed cache key from the given parts.
+    Text parts are normalized (lowercased, whitespace collapsed) so trivial
+    formatting differences map to the same key.
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, str):
+            part = " ".join(part.lower().split())
+        normalized.append(part)
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TwoTierCache:
+    """
+    Small in-process LRU in front of a SQLite table.
+
+    Values must be JSON-serializable. Entries expire after `ttl` seconds and
+    the on-disk table is trimmed to `max_entries` (least recently used first).
+    The database is opened on first use, not when the cache is created.
+    """
+
+    def __init__(self, name, ttl=7 * 24 * 3600, max_entries=10000, memory_size=256, path=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = LazyResource(self._open)
+
+    def _open(self):
+        """Connection to the on-disk table, or None to cache in memory only"""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.commit()
+            return conn
+        except Exception as e:
+            # Fall back to memory-only caching
+            print(f"Could not open cache database {self.path}: {e}")
+            return None
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key, count_stats=True):
+        """Return the cached value for key, or None on a miss"""
+        entry = self.get_with_age(key, count_stats)
+        return entry[0] if entry is not None else None
+
+    def get_with_age(self, key, count_stats=True):
+        """
+        Return (value, age_in_seconds) for key, or None on a miss.
+        Values from the memory tier are shared objects - do not mutate them.
+        Pass count_stats=False for lookups that should not affect the hit rate.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    if count_stats:
+                        self.hits += 1
+                        self.memory_hits += 1
+                    return value, now - created
+                del self._memory[key]
+
+            conn = self._db.get()
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        "SELECT value, created FROM entries WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        if self._expired(row[1], now):
+                            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                            conn.commit()
+                        else:
+                            value = json.loads(row[0])
+                            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                            conn.commit()
+                            self._remember(key, value, row[1])
+                            if count_stats:
+                                self.hits += 1
+                            return value, now - row[1]
+                except Exception as e:
+                    print(f"Cache read error ({self.name}): {e}")
+
+            if count_stats:
+                self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store value under key in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            conn = self._db.get()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                self._evict(conn, now)
+                conn.commit()
+            except Exception as e:
+                print(f"Cache write error ({self.name}): {e}")
+
+    def _evict(self, conn, now):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            conn = self._db.get()
+            if conn is not None:
+                conn.execute("DELETE FROM entries")
+                conn.commit()
+
+    def stats(self):
+        """Hit/miss counters for this cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            disk_entries = 0
+            conn = self._db.get()
+            if conn is not None:
+                try:
+                    disk_entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                except Exception:
+                    pass
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.hits - self.memory_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries
+            }
@@ -1,19 +1,73 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tavily import TavilyClient
 from dotenv import load_dotenv
-from qdrant_manager import save_product_to_qdrant, initialize_qdrant, extract_ingredients_from_content
-from groq_analyzer import analyze_ingredients_with_groq
-from ingredient_analyzer import extract_harmful_ingredients, get_risk_emoji
-from inngest_monitor import track_tavily_search
+from qdrant_manager import (
+    save_products_to_qdrant, extract_ingredients_from_content,
+    get_stored_products, is_product_unchanged, product_point_id
+)
+from groq_analyzer import analyze_ingredients_with_groq, analyze_products_batch, ANALYSIS_BATCH_SIZE
+from ingredient_analyzer import risk_fields, get_risk_emoji, get_analysis_label, RISK_FIELDS
+from inngest_monitor import track_tavily_search, track_search_timing
+from page_fetcher import get_product_image, get_fetch_pool
+from result_cache import TwoTierCache, make_cache_key
+from lazy_resource import LazyResource
+from tracing import span, start_trace, run_in_context
+from enrichment_queue import EnrichmentQueue
 
 load_dotenv()
 
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+def _create_tavily_client():
+    # TAVILY_BASE_URL points the client at another endpoint (e.g. the benchmark fakes)
+    base_url = os.getenv("TAVILY_BASE_URL")
+    if base_url:
+        return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"), api_base_url=base_url)
+    return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
 
-# Initialize Qdrant on module load
-initialize_qdrant()
+
+# Built on first use, once per process
+_tavily_client = LazyResource(_create_tavily_client)
+
+
+def get_tavily_client():
+    """Shared Tavily client"""
+    return _tavily_client.get()
+
+
+# Maximum number of results analysed/saved concurrently per search
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "8"))
+
+# Tavily responses are fresh for TAVILY_CACHE_TTL seconds. For a further
+# TAVILY_CACHE_STALE seconds they are still served, but refreshed in the background.
+TAVILY_CACHE_TTL = int(os.getenv("TAVILY_CACHE_TTL", "900"))
+TAVILY_CACHE_STALE = int(os.getenv("TAVILY_CACHE_STALE", "3600"))
+
+STORE_DOMAINS = [
+    "coles.com.au",
+    "aldi.com.au",
+    "chemistwarehouse.com.au",
+    "woolworths.com.au",
+    "iga.com.au",
+    "target.com.au",
+    "kmart.com.au",
+    "bunnings.com.au"
+]
+
+tavily_cache = TwoTierCache(
+    "tavily_search",
+    ttl=TAVILY_CACHE_TTL + TAVILY_CACHE_STALE,
+    max_entries=int(os.getenv("TAVILY_CACHE_MAX_ENTRIES", "2000"))
+)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Background analysis of search hits (see search_products_async)
+enrichment_queue = EnrichmentQueue(
+    max_workers=int(os.getenv("ENRICH_MAX_JOBS", "2")),
+    max_jobs=int(os.getenv("ENRICH_KEEP_JOBS", "200"))
+)
 
 
 def extract_image_from_result(result):
@@ -28,47 +82,8 @@ def extract_image_from_result(result):
         return None
     
     try:
-        # Set a timeout and user agent
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=5)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Try different image selectors for various stores
-            image_selectors = [
-                # Coles
-                'img[class*="product"]',
-                'img[class*="Product"]',
-                # Woolworths
-                'img[class*="image"]',
-                'img[alt*="product"]',
-                # General
-                'meta[property="og:image"]',
-                'img[itemprop="image"]',
-                'img.product-image',
-                'img.main-image'
-            ]
-            
-            for selector in image_selectors:
-                if selector.startswith('meta'):
-                    img = soup.select_one(selector)
-                    if img and img.get('content'):
-                        return img.get('content')
-                else:
-                    img = soup.select_one(selector)
-                    if img and img.get('src'):
-                        img_url = img.get('src')
-                        # Make absolute URL if relative
-                        if img_url.startswith('//'):
-                            img_url = 'https:' + img_url
-                        elif img_url.startswith('/'):
-                            from urllib.parse import urlparse
-                            parsed = urlparse(url)
-                            img_url = f"{parsed.scheme}://{parsed.netloc}{img_url}"
-                        return img_url
+        with span("image.fetch"):
+            return get_product_image(url)
     except Exception as e:
         # Silently fail - image extraction is optional
         print(f"Could not extract image from {url}: {e}")
@@ -76,114 +91,465 @@ def extract_image_from_result(result):
     return None
 
 
-def format_results_simple(search_results, product_description, stores):
+def _result_ingredients(result):
+    return extract_ingredients_from_content(
+        result.get('content', ''),
+        result.get('title', '')
+    )
+
+
+def _enrich_result(result, store_name, product_description):
     """
-    Format search results without using GPT and save to Qdrant
+    Run the Groq analysis and image lookup for a single result.
+    Annotates the result for display and returns the product dict to save to Qdrant.
     """
-    if not search_results:
-        return f"No products found for '{product_description}' in the selected stores. Try:\n- Using a different product name\n- Selecting different stores\n- Making your search more specific"
+    # The image lookup runs on the shared fetch pool while Groq analyses the ingredients
+    image = run_in_context(get_fetch_pool(), extract_image_from_result, result)
+    ingredients_for_analysis = _result_ingredients(result)
+    
+    groq_result = analyze_ingredients_with_groq(
+        result.get('title', ''),
+        ingredients_for_analysis,
+        store_name
+    )
     
-    # Group results by store
-    store_results = {}
-    saved_count = 0
+    return _annotate_result(result, store_name, product_description, ingredients_for_analysis, groq_result, image.result())
+
+
+def _enrich_batch(items, product_description):
+    """
+    Enrich several results with one batched Groq request. The image lookups
+    run on the shared fetch pool while the analysis request is in flight.
     
+    Args:
+        items: List of (result, store_name) tuples
+    
+    Returns:
+        List of product dicts to save, in the same order
+    """
+    ingredients = [_result_ingredients(result) for result, _ in items]
+    fetch_pool = get_fetch_pool()
+    images = [run_in_context(fetch_pool, extract_image_from_result, result) for result, _ in items]
+    groq_results = analyze_products_batch([
+        {"title": result.get('title', ''), "ingredients": ingredients[i], "store": store_name}
+        for i, (result, store_name) in enumerate(items)
+    ])
+    return [
+        _annotate_result(result, store_name, product_description, ingredients[i], groq_results[i], images[i].result())
+        for i, (result, store_name) in enumerate(items)
+    ]
+
+
+def _annotate_result(result, store_name, product_description, ingredients_for_analysis, groq_result, image_url):
+    """Annotate a result for display and build the product dict to save to Qdrant"""
+    groq_analysis = groq_result.get('analysis', '') if groq_result.get('success') else ''
+    analysis_data = groq_result.get('structured') if groq_result.get('success') else None
+    
+    # Risk summary is computed once and shared by the display and the saved payload
+    risk = risk_fields(groq_analysis, analysis_data)
+    
+    # Add to result for display
+    result['extracted_ingredients'] = ingredients_for_analysis
+    result['groq_analysis'] = groq_analysis
+    result['analysis_route'] = groq_result.get('route')
+    result['image'] = image_url
+    result.update(risk)
+    
+    return {
+        'title': result.get('title', ''),
+        'url': result.get('url', ''),
+        'content': result.get('content', ''),
+        'store': store_name,
+        'product_description': product_description,
+        'groq_analysis': groq_analysis,
+        'analysis_data': analysis_data,
+        'analysis_route': groq_result.get('route'),
+        'image': image_url,
+        **risk
+    }
+
+
+def _no_results_message(product_description):
+    return f"No products found for '{product_description}' in the selected stores. Try:\n- Using a different product name\n- Selecting different stores\n- Making your search more specific"
+
+
+def _match_store(url, stores):
+    """Return the selected store a result URL belongs to, or None"""
+    for store in stores:
+        store_domain = store.lower().replace(" ", "")
+        if store_domain in url.lower():
+            return store
+    return None
+
+
+def render_product_block(result):
+    """
+    Render one annotated search result as markdown.
+    
+    Returns:
+        Tuple of (markdown, risk_level)
+    """
+    title = result.get('title', 'No title')
+    url = result.get('url', '#')
+    content = result.get('content', 'No description available')
+    ingredients = result.get('extracted_ingredients', '')
+    groq_analysis = result.get('groq_analysis', '')
+    image_url = result.get('image')
+    risk_level = None
+    
+    output = f"### {title}\n"
+    if image_url:
+        output += f"![Product Image]({image_url})\n\n"
+    output += f"🔗 [View Product]({url})\n\n"
+    
+    if groq_analysis:
+        # Harmful ingredients summary, computed when the product was analysed
+        risk_level = result.get('risk_level', 'UNKNOWN')
+        risk_emoji = get_risk_emoji(risk_level)
+        
+        # Show risk level prominently
+        output += f"**Safety Rating:** {risk_emoji} {risk_level}\n\n"
+        
+        if result.get('has_harmful'):
+            output += f"**⚠️ HARMFUL INGREDIENTS DETECTED:**\n"
+            if result.get('harmful_list'):
+                for harmful in result['harmful_list']:
+                    output += f"- {harmful}\n"
+            output += "\n"
+        else:
+            output += f"**✅ No harmful ingredients detected**\n\n"
+        
+        output += f"**{get_analysis_label(result.get('analysis_route'))}:**\n{groq_analysis}\n\n"
+    elif ingredients:
+        output += f"**Ingredients/Details:** {ingredients}\n\n"
+    else:
+        output += f"{content[:200]}...\n\n"
+    
+    output += "---\n\n"
+    return output, risk_level
+
+
+def render_pending_block(title, url, status="pending"):
+    """Placeholder markdown for a search hit that has not been analysed (yet)"""
+    output = f"### {title or 'No title'}\n"
+    output += f"🔗 [View Product]({url or '#'})\n\n"
+    if status == "failed":
+        output += "⚠️ Analysis unavailable\n\n"
+    else:
+        output += "⏳ Analysing ingredients...\n\n"
+    output += "---\n\n"
+    return output
+
+
+def iter_results_simple(search_results, product_description, stores, max_workers=None, batch_size=None):
+    """
+    Analyse, render and save search results, yielding each product as soon
+    as its analysis finishes. Results are analysed `batch_size` at a time
+    per Groq request (defaults to ANALYSIS_BATCH_SIZE).
+    
+    Yields:
+        {"type": "product", "index", "store", "markdown", "risk_level"} per
+        matched result (index is its position among the matched results),
+        then one {"type": "summary", "saved_count", "unchanged_count"}
+    """
+    matched = []
     for result in search_results:
-        url = result.get('url', '')
-        # Extract store name from URL
-        store_name = None
-        for store in stores:
-            store_domain = store.lower().replace(" ", "")
-            if store_domain in url.lower():
-                store_name = store
-                break
+        store_name = _match_store(result.get('url', ''), stores)
         if store_name:
-            if store_name not in store_results:
-                store_results[store_name] = []
-            store_results[store_name].append(result)
-            
-            # Analyze ingredients with Groq
-            ingredients_for_analysis = extract_ingredients_from_content(
-                result.get('content', ''),
-                result.get('title', '')
-            )
-            
-            groq_result = analyze_ingredients_with_groq(
-                result.get('title', ''),
-                ingredients_for_analysis,
-                store_name
-            )
-            
-            groq_analysis = groq_result.get('analysis', '') if groq_result.get('success') else ''
-            
-            # Save to Qdrant with Groq analysis
-            image_url = extract_image_from_result(result)
-            product_data = {
-                'title': result.get('title', ''),
-                'url': url,
-                'content': result.get('content', ''),
-                'store': store_name,
-                'product_description': product_description,
-                'groq_analysis': groq_analysis,
-                'image': image_url
-            }
-            success, ingredients = save_product_to_qdrant(product_data)
-            if success:
-                saved_count += 1
-                # Add to result for display
-                result['extracted_ingredients'] = ingredients
-                result['groq_analysis'] = groq_analysis
-                result['image'] = image_url
-    
-    # Format output
+            matched.append((result, store_name))
+    
+    def product_event(index):
+        result, store_name = matched[index]
+        markdown, risk_level = render_product_block(result)
+        return {
+            "type": "product",
+            "index": index,
+            "store": store_name,
+            "markdown": markdown,
+            "risk_level": risk_level
+        }
+    
+    # Products already saved with identical content keep their stored
+    # analysis, so they skip Groq, the image lookup and the encoder
+    stored = get_stored_products([result for result, _ in matched])
+    unchanged_count = 0
+    to_enrich = []
+    for index, (result, store_name) in enumerate(matched):
+        payload = stored.get(product_point_id(result))
+        if is_product_unchanged(result, payload):
+            unchanged_count += 1
+            result['extracted_ingredients'] = payload.get('ingredients', '')
+            result['groq_analysis'] = payload.get('groq_analysis', '')
+            result['analysis_route'] = payload.get('analysis_route')
+            result['image'] = payload.get('image')
+            result.update({field: payload[field] for field in RISK_FIELDS if field in payload})
+            yield product_event(index)
+        else:
+            to_enrich.append(index)
+    
+    # Analyze and fetch images for the remaining results in parallel,
+    # yielding each batch of results as it completes
+    if max_workers is None:
+        max_workers = SEARCH_MAX_WORKERS
+    if batch_size is None:
+        batch_size = ANALYSIS_BATCH_SIZE
+    batch_size = max(1, batch_size)
+    batches = [to_enrich[start:start + batch_size] for start in range(0, len(to_enrich), batch_size)]
+    
+    def enrich(batch):
+        if len(batch) == 1:
+            result, store_name = matched[batch[0]]
+            return [_enrich_result(result, store_name, product_description)]
+        return _enrich_batch([matched[index] for index in batch], product_description)
+    
+    workers = max(1, min(max_workers, len(batches)))
+    products = {}
+    if workers == 1:
+        for batch in batches:
+            products.update(zip(batch, enrich(batch)))
+            for index in batch:
+                yield product_event(index)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {run_in_context(executor, enrich, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                products.update(zip(batch, future.result()))
+                for index in batch:
+                    yield product_event(index)
+    
+    # Save to Qdrant with Groq analysis in a single batch
+    to_save = [products[index] for index in to_enrich]
+    saved_count = sum(1 for success, _ in save_products_to_qdrant(to_save) if success)
+    
+    yield {"type": "summary", "saved_count": saved_count, "unchanged_count": unchanged_count}
+
+
+def _assemble_results(product_description, stores, blocks, saved_count, unchanged_count, pending_count=0):
+    """
+    Build the full results markdown from rendered product blocks.
+    
+    Args:
+        blocks: Dict of store name to that store's markdown blocks, in result order
+        pending_count: Products still being analysed (replaces the saved line)
+    """
     output = f"# Search Results for: {product_description}\n\n"
-    output += f"💾 **Saved {saved_count} products to database**\n\n"
+    if pending_count:
+        output += f"⏳ **Analysing {pending_count} more product{'s' if pending_count != 1 else ''}...**"
+    else:
+        output += f"💾 **Saved {saved_count} products to database**"
+        if unchanged_count:
+            output += f" ({unchanged_count} already up to date)"
+    output += "\n\n"
     
     for store in stores:
         output += f"## {store}\n\n"
-        if store in store_results:
-            for result in store_results[store]:
-                title = result.get('title', 'No title')
-                url = result.get('url', '#')
-                content = result.get('content', 'No description available')
-                ingredients = result.get('extracted_ingredients', '')
-                groq_analysis = result.get('groq_analysis', '')
-                image_url = result.get('image')
-                
-                output += f"### {title}\n"
-                if image_url:
-                    output += f"![Product Image]({image_url})\n\n"
-                output += f"🔗 [View Product]({url})\n\n"
-                
-                if groq_analysis:
-                    # Extract harmful ingredients summary
-                    harmful_info = extract_harmful_ingredients(groq_analysis)
-                    risk_emoji = get_risk_emoji(harmful_info['risk_level'])
-                    
-                    # Show risk level prominently
-                    output += f"**Safety Rating:** {risk_emoji} {harmful_info['risk_level']}\n\n"
-                    
-                    if harmful_info['has_harmful']:
-                        output += f"**⚠️ HARMFUL INGREDIENTS DETECTED:**\n"
-                        if harmful_info['harmful_list']:
-                            for harmful in harmful_info['harmful_list']:
-                                output += f"- {harmful}\n"
-                        output += "\n"
-                    else:
-                        output += f"**✅ No harmful ingredients detected**\n\n"
-                    
-                    output += f"**🤖 Full AI Analysis:**\n{groq_analysis}\n\n"
-                elif ingredients:
-                    output += f"**Ingredients/Details:** {ingredients}\n\n"
-                else:
-                    output += f"{content[:200]}...\n\n"
-                
-                output += "---\n\n"
+        if blocks.get(store):
+            output += "".join(blocks[store])
         else:
             output += f"❌ No results found at {store}\n\n"
     
     return output
 
 
+def _collect_results(events, product_description, stores):
+    """Consume iter_results_simple events into the full results markdown"""
+    products = []
+    summary = {"saved_count": 0, "unchanged_count": 0}
+    for event in events:
+        if event["type"] == "product":
+            products.append(event)
+        else:
+            summary = event
+    
+    # Events arrive in completion order; restore result order per store
+    blocks = {}
+    for event in sorted(products, key=lambda e: e["index"]):
+        blocks.setdefault(event["store"], []).append(event["markdown"])
+    return _assemble_results(product_description, stores, blocks, summary["saved_count"], summary["unchanged_count"])
+
+
+def format_results_simple(search_results, product_description, stores, max_workers=None, batch_size=None):
+    """
+    Format search results without using GPT and save to Qdrant
+    
+    Args:
+        search_results: Raw Tavily results
+        product_description: User's description of the product
+        stores: List of store names to keep results for
+        max_workers: Number of results enriched in parallel (defaults to
+            SEARCH_MAX_WORKERS; 1 processes them one after another)
+        batch_size: Results analysed per Groq request (defaults to
+            ANALYSIS_BATCH_SIZE; 1 analyses each result separately)
+    """
+    if not search_results:
+        return _no_results_message(product_description)
+    
+    events = iter_results_simple(search_results, product_description, stores, max_workers, batch_size)
+    return _collect_results(events, product_description, stores)
+
+
+def _fetch_tavily_results(product_description, stores):
+    """Run the Tavily search and return its raw results list"""
+    search_query = f"{product_description} price Australia {' '.join(stores)}"
+    
+    with span("tavily.search") as record:
+        tavily_response = get_tavily_client().search(
+            query=search_query,
+            search_depth="advanced",
+            max_results=10,
+            include_domains=STORE_DOMAINS
+        )
+        record["items"] = len(tavily_response.get('results', []))
+    return tavily_response.get('results', [])
+
+
+def _refresh_in_background(cache_key, product_description, stores):
+    """Re-run a stale search without blocking the caller"""
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+    
+    def refresh():
+        try:
+            tavily_cache.set(cache_key, _fetch_tavily_results(product_description, stores))
+        except Exception as e:
+            print(f"Background Tavily refresh failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(cache_key)
+    
+    threading.Thread(target=refresh, name="tavily-refresh", daemon=True).start()
+
+
+def get_tavily_results(product_description, stores):
+    """
+    Cached Tavily search keyed by the normalized query and sorted store list.
+    
+    Returns:
+        Tuple of (results, cached)
+    """
+    cache_key = make_cache_key(product_description, sorted(store.lower() for store in stores))
+    entry = tavily_cache.get_with_age(cache_key)
+    if entry is not None:
+        results, age = entry
+        if age > TAVILY_CACHE_TTL:
+            # Stale: serve it now and refresh for the next caller
+            _refresh_in_background(cache_key, product_description, stores)
+        # Results are annotated in place later, so never hand out the cached objects
+        return copy.deepcopy(results), True
+    
+    results = _fetch_tavily_results(product_description, stores)
+    tavily_cache.set(cache_key, results)
+    return copy.deepcopy(results), False
+
+
+def _finish_trace(trace, product_description):
+    """Per-stage breakdown of a finished search, also sent to Inngest"""
+    stages = trace.summary()
+    track_search_timing(product_description, trace.duration_ms, stages, trace.histograms(), trace.name)
+    return {"duration_ms": round(trace.duration_ms, 1), "stages": stages}
+
+
+def _enrichment_events(search_results, product_description, stores):
+    """Background half of search_products_async: analyse, scrape and save the hits"""
+    with start_trace("enrichment") as trace:
+        yield from iter_results_simple(search_results, product_description, stores)
+    yield {"type": "trace", "trace": _finish_trace(trace, product_description)}
+
+
+def search_products_async(product_description, stores):
+    """
+    Return the Tavily hits as soon as the search itself finishes, and queue
+    their analysis, image lookup and saving on the background enrichment pool.
+    
+    Args:
+        product_description: User's description of the product they want
+        stores: List of store names to search in
+    
+    Returns:
+        Dict with "hits" (index, store, title, url and placeholder markdown per
+        matched result) and "job_id" to poll with get_search_job (None when
+        nothing matched)
+    """
+    if not os.getenv("TAVILY_API_KEY"):
+        return {
+            "success": False,
+            "error": "Tavily API key not found. Please set TAVILY_API_KEY in your .env file.",
+            "results": None
+        }
+    
+    try:
+        with start_trace("search") as trace:
+            search_results, cached = get_tavily_results(product_description, stores)
+        
+        if not cached:
+            track_tavily_search(product_description, stores, len(search_results), True)
+        
+        # Same matching (and so the same indexes) as iter_results_simple
+        hits = []
+        for result in search_results:
+            store_name = _match_store(result.get('url', ''), stores)
+            if store_name:
+                hits.append({
+                    "index": len(hits),
+                    "store": store_name,
+                    "title": result.get('title', ''),
+                    "url": result.get('url', ''),
+                    "markdown": render_pending_block(result.get('title', ''), result.get('url', ''))
+                })
+        
+        job_id = None
+        if hits:
+            job_id = enrichment_queue.submit(
+                hits, lambda: _enrichment_events(search_results, product_description, stores)
+            )
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "hits": hits,
+            "results": None if hits else _no_results_message(product_description),
+            "raw_results": search_results,
+            "search_engine": "Tavily",
+            "cached": cached,
+            "trace": _finish_trace(trace, product_description)
+        }
+    except Exception as e:
+        track_tavily_search(product_description, stores, 0, False, error=e)
+        return {
+            "success": False,
+            "error": str(e),
+            "results": None
+        }
+
+
+def get_search_job(job_id):
+    """Per-product status of a search_products_async job (see EnrichmentQueue.status)"""
+    return enrichment_queue.status(job_id)
+
+
+def format_search_job(job, product_description, stores):
+    """
+    Results markdown for a search job so far: finished products are shown in
+    full, the rest as placeholders.
+    """
+    blocks = {}
+    pending_count = 0
+    for product in job["products"]:
+        if product["status"] == "done":
+            markdown = product["markdown"]
+        else:
+            pending_count += product["status"] == "pending"
+            markdown = render_pending_block(product.get("title"), product.get("url"), product["status"])
+        blocks.setdefault(product["store"], []).append(markdown)
+    return _assemble_results(
+        product_description, stores, blocks,
+        job["saved_count"], job["unchanged_count"], pending_count
+    )
+
+
 def search_products_with_tavily(product_description, stores):
     """
     Use Tavily to search the web for products.
@@ -204,37 +570,24 @@ def search_products_with_tavily(product_description, stores):
         }
     
     try:
-        # Search with Tavily
-        search_query = f"{product_description} price Australia {' '.join(stores)}"
-        
-        tavily_response = tavily_client.search(
-            query=search_query,
-            search_depth="advanced",
-            max_results=10,
-            include_domains=[
-                "coles.com.au",
-                "aldi.com.au", 
-                "chemistwarehouse.com.au",
-                "woolworths.com.au",
-                "iga.com.au",
-                "target.com.au",
-                "kmart.com.au",
-                "bunnings.com.au"
-            ]
-        )
-        
-        # Format results without GPT
-        search_results = tavily_response.get('results', [])
-        formatted_results = format_results_simple(search_results, product_description, stores)
+        with start_trace("search") as trace:
+            # Search with Tavily (or reuse a recent identical search)
+            search_results, cached = get_tavily_results(product_description, stores)
+            
+            # Format results without GPT
+            formatted_results = format_results_simple(search_results, product_description, stores)
         
         # Track with Inngest
-        track_tavily_search(product_description, stores, len(search_results), True)
+        if not cached:
+            track_tavily_search(product_description, stores, len(search_results), True)
         
         return {
             "success": True,
             "results": formatted_results,
             "raw_results": search_results,
-            "search_engine": "Tavily"
+            "search_engine": "Tavily",
+            "cached": cached,
+            "trace": _finish_trace(trace, product_description)
         }
         
     except Exception as e:
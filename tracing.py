@@ -0,0 +1,173 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Span attributes that are summed per stage in summaries
+SUMMED_ATTRIBUTES = ["prompt_tokens", "completion_tokens", "total_tokens", "items"]
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _bucket_label(duration_ms):
+    for bound in HISTOGRAM_BUCKETS_MS:
+        if duration_ms <= bound:
+            return f"<={bound}ms"
+    return f">{HISTOGRAM_BUCKETS_MS[-1]}ms"
+
+
+def _histogram(durations_ms):
+    counts = {}
+    for duration in durations_ms:
+        label = _bucket_label(duration)
+        counts[label] = counts.get(label, 0) + 1
+    return counts
+
+
+class Trace:
+    """
+    Spans recorded while handling one request (e.g. one search).
+    Spans may be added from worker threads that run in the trace's context.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.time()
+        return (end - self.start) * 1000
+
+    def summary(self):
+        """
+        Per-stage breakdown of the spans.
+
+        Returns:
+            Dict of stage name to {"count", "total_ms", "max_ms"} plus the
+            summed token counts of that stage's spans, slowest stage first
+        """
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += span["duration_ms"]
+            stage["max_ms"] = max(stage["max_ms"], span["duration_ms"])
+            for attribute in SUMMED_ATTRIBUTES:
+                if isinstance(span.get(attribute), (int, float)):
+                    stage[attribute] = stage.get(attribute, 0) + span[attribute]
+        for stage in stages.values():
+            stage["total_ms"] = round(stage["total_ms"], 1)
+            stage["max_ms"] = round(stage["max_ms"], 1)
+        return dict(sorted(stages.items(), key=lambda item: -item[1]["total_ms"]))
+
+    def histograms(self):
+        """Latency histogram (bucket label -> span count) per stage"""
+        with self._lock:
+            spans = list(self.spans)
+        durations = {}
+        for span in spans:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+        return {name: _histogram(values) for name, values in durations.items()}
+
+
+class StageHistograms:
+    """Process-wide latency histograms per stage, across all requests"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, duration_ms):
+        label = _bucket_label(duration_ms)
+        with self._lock:
+            stage = self._counts.setdefault(name, {})
+            stage[label] = stage.get(label, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+
+stage_histograms = StageHistograms()
+
+
+def get_stage_histograms():
+    """Latency histograms per stage since the process started"""
+    return stage_histograms.snapshot()
+
+
+def histogram_percentile(counts, fraction):
+    """Label of the bucket the given fraction (e.g. 0.95) of a histogram's spans fall within"""
+    labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+    total = sum(counts.values())
+    seen = 0
+    for label in labels:
+        seen += counts.get(label, 0)
+        if total and seen >= fraction * total:
+            return label
+    return None
+
+
+def current_trace():
+    """The trace being recorded in this context, or None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name):
+    """
+    Record spans from this context (and workers started with run_in_context)
+    into a new Trace, which is yielded.
+    """
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.end = time.time()
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Exited from another context (e.g. a generator closed elsewhere)
+            _current_trace.set(None)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as one span of the current trace. The yielded dict can be
+    given extra attributes (e.g. token counts) before the block ends.
+    Spans are always added to the process-wide histograms, even outside a trace.
+    """
+    record = dict(attributes, name=name, start=time.time())
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration_ms"] = (time.perf_counter() - started) * 1000
+        record["end"] = record["start"] + record["duration_ms"] / 1000
+        stage_histograms.record(name, record["duration_ms"])
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(record)
+
+
+def run_in_context(executor, func, *args, **kwargs):
+    """executor.submit, but the task records its spans into the caller's trace"""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)